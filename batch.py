@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""Schedules many input workbooks in one run, spread over a pool of worker processes.
+
+Each worker imports the scheduler once and then takes input files one at a time, so start-up is
+paid per worker rather than per file, and memory is bounded by the number of workers (which can
+also be recycled after a number of files). Outputs are named after their input files, so
+tournaments sharing a name don't overwrite each other. A summary of each file's timings and
+schedule problems is printed, and can be saved as JSON."""
+import argparse
+import contextlib
+import glob
+import io
+import json
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import schedule
+from scheduler.cache import ScheduleCache
+
+INPUT_PATTERNS = ('*.xlsm', '*.xlsx')
+
+def find_inputs(paths):
+    """Expands directories and glob patterns into a list of input workbooks, without duplicates.
+
+    Directories contribute their .xlsm and .xlsx files, other than exported schedules."""
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            found += sorted(fpath for pattern in INPUT_PATTERNS
+                            for fpath in glob.glob(os.path.join(path, pattern))
+                            if not fpath.endswith('_schedule.xlsx'))
+        else:
+            found += sorted(glob.glob(path)) or [path]
+    return sorted(set(found), key=found.index)
+
+def schedule_file(fpath, out_dir=None, cache=None, search_workers=1):
+    """Schedules (or reuses the cached schedule of) and exports one input workbook; never raises.
+
+    search_workers -- processes searching each schedule's tables (default 1)
+
+    Returns a summary dict of the input and output paths, the seconds spent in each phase, the
+    schedule problems found, and the error (a traceback) if the file could not be scheduled."""
+    result = {'file': fpath, 'output': None, 'seconds': {}, 'problems': [], 'error': None}
+    phase_start = time.perf_counter()
+    def lap(phase):
+        nonlocal phase_start
+        now = time.perf_counter()
+        result['seconds'][phase] = round(now - phase_start, 3)
+        phase_start = now
+
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            logic_params, _, io_params = schedule.read_data(fpath)
+            lap('read')
+            tment = schedule.run_tournament(logic_params, cache, workers=search_workers)
+            lap('schedule')
+            result['problems'] = sum(schedule.schedule_problems(tment).values(), [])
+            workbook = schedule.export(tment, *io_params)
+            lap('export')
+            name = os.path.splitext(os.path.basename(fpath))[0]
+            result['output'] = schedule.save_schedule(workbook, fpath, name, out_dir)
+            lap('save')
+    except Exception:
+        result['error'] = traceback.format_exc()
+    result['seconds']['total'] = round(sum(result['seconds'].values()), 3)
+    return result
+
+def run(fpaths, workers=None, out_dir=None, max_tasks_per_child=None, cache=None,
+        search_workers=1):
+    """Schedules every input, returning their summaries in input order.
+
+    workers -- the number of worker processes (default: the number of CPUs); 1 runs in-process
+    max_tasks_per_child -- replace each worker after this many files (default: never)
+    cache -- a ScheduleCache shared by the workers (default None)
+    search_workers -- processes each worker searches table schedules on (default 1)"""
+    workers = min(workers or os.cpu_count() or 1, len(fpaths)) or 1
+    if workers == 1:
+        results = []
+        for fpath in fpaths:
+            results.append(schedule_file(fpath, out_dir, cache, search_workers))
+            print(_progress(results[-1], len(results), len(fpaths)), file=sys.stderr)
+        return results
+
+    results = {}
+    with ProcessPoolExecutor(workers, max_tasks_per_child=max_tasks_per_child) as pool:
+        futures = {pool.submit(schedule_file, fpath, out_dir, cache, search_workers): fpath
+                   for fpath in fpaths}
+        for future in as_completed(futures):
+            results[futures[future]] = future.result()
+            print(_progress(results[futures[future]], len(results), len(fpaths)), file=sys.stderr)
+    return [results[fpath] for fpath in fpaths]
+
+def _progress(result, done, total):
+    """Returns a one-line progress message for a finished file."""
+    status = 'failed' if result['error'] else f"{len(result['problems'])} problems"
+    return f"[{done}/{total}] {result['file']}: {status} ({result['seconds']['total']:.1f}s)"
+
+def summary(results):
+    """Returns a printable table of the results, followed by any problems and errors."""
+    lines = [f"{'input':<40} {'status':>8} {'read':>7} {'schedule':>9} {'export':>7} {'save':>6}"
+             f" {'total':>7}"]
+    for result in results:
+        secs = result['seconds']
+        status = 'error' if result['error'] else \
+                 f"{len(result['problems'])} prob" if result['problems'] else 'ok'
+        lines.append(f"{os.path.basename(result['file']):<40} {status:>8}"
+                     + ''.join(f" {secs.get(phase, 0):>{width}.2f}" for phase, width in
+                               (('read', 7), ('schedule', 9), ('export', 7), ('save', 6),
+                                ('total', 7))))
+    for result in results:
+        if result['problems'] or result['error']:
+            lines += ['', result['file'] + ':'] + ['\t' + problem for problem in result['problems']]
+            lines += [result['error'].rstrip()] if result['error'] else []
+    return '\n'.join(lines)
+
+def main(argv=None):
+    """Runs a batch from the command line; returns 1 if any file failed or has problems."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('paths', nargs='+', help="input workbooks, directories or glob patterns")
+    parser.add_argument('-j', '--workers', type=int,
+                        help="worker processes to use (default: the number of CPUs)")
+    parser.add_argument('--search-workers', type=int, default=1, metavar='N',
+                        help="also search each schedule's tables on N processes")
+    parser.add_argument('--max-tasks-per-child', type=int, metavar='N',
+                        help="replace each worker after N files to cap memory growth")
+    parser.add_argument('--output-dir', help="save schedules here instead of beside each input")
+    parser.add_argument('--report', help="write the summary of every file to this JSON file")
+    parser.add_argument('--cache', action='store_true',
+                        help="reuse a finished schedule saved for the same settings, and save "
+                             "new ones, in an on-disk cache")
+    parser.add_argument('--cache-dir', help="where schedules are cached, implying --cache "
+                                            "(default: a per-user cache directory)")
+    args = parser.parse_args(argv)
+
+    fpaths = find_inputs(args.paths)
+    if not fpaths:
+        parser.error("no input workbooks found")
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+    start = time.perf_counter()
+    cache = ScheduleCache(args.cache_dir) if args.cache or args.cache_dir else None
+    results = run(fpaths, args.workers, args.output_dir, args.max_tasks_per_child, cache,
+                  args.search_workers)
+    print(summary(results))
+    print(f'\n{len(results)} files in {time.perf_counter() - start:.1f}s')
+    if args.report:
+        with open(args.report, 'w') as fout:
+            json.dump(results, fout, indent=2)
+    return int(any(result['error'] or result['problems'] for result in results))
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""Benchmarks each scheduling and export phase over the test fixtures and synthetic rosters.
+
+Every input is read once and then runs twice: a timing pass, then a tracemalloc pass that records
+peak memory, and the memory each phase leaves allocated, along with the scheduler's profiling
+counters (tracing distorts timings, so the two are kept apart). Phase times and peaks are inclusive
+of nested phases. Results are printed (or saved) as JSON and can be compared against a stored
+baseline such as tests/benchmark_baseline.json, exiting with status 1 on regressions or if any
+schedule has a conflict that validate finds (test.sh checks only the conflicts, since timings
+depend on the machine)."""
+import argparse
+import contextlib
+import functools
+import gc
+import glob
+import io
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+import warnings
+from datetime import datetime, timedelta
+import schedule
+import scheduler.profiling as profiling
+from scheduler.tournament import Tournament
+from scheduler.validate import validate
+
+PHASES = [(schedule, 'read_data'), (Tournament, 'split_divisions'),
+          (Tournament, 'judge_interlaced'), (Tournament, 'judge_interlaced_calib'),
+          (Tournament, 'judge_block'), (Tournament, 'assign_judge_times'),
+          (Tournament, 'search_matches'), (Tournament, 'block_matches'),
+          (Tournament, 'assign_tables'), (Tournament, 'improve'),
+          (schedule, 'export_judge_views'), (schedule, 'export_table_views'),
+          (schedule, 'export_team_views')]
+
+#(teams, judging sets, table pairs[, divisions])
+SYNTHETIC = [(50, 1, 2), (50, 5, 3), (100, 10, 5), (200, 20, 8), (350, 20, 10), (500, 20, 12),
+             (120, 20, 8, 30), (200, 24, 8, 20)]
+
+#the phases saved with --summary, each covering the nested phases of its part of a run
+SUMMARY_PHASES = ('read_data', 'schedule', 'validate', 'export', 'save')
+
+#the validate kinds no schedule should have (a tight roster may not avoid travel or lunch ones)
+CONFLICTS = ('room', 'table', 'missing')
+
+#dependencies that importing schedule should leave to the code paths needing them
+HEAVY_MODULES = ('numpy', 'openpyxl', 'pandas', 'tkinter', 'multiprocessing')
+
+class Recorder:
+    """Collects wall time, peak and retained traced memory and call counts for named phases."""
+    def __init__(self, trace):
+        self.trace = trace
+        self.stats = {}
+        self.frames = [] #[memory at entry, highest peak seen] for each open phase
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Records the wall time, peak memory and count of one call of a phase."""
+        stat = self.stats.setdefault(name, {'calls': 0, 'wall': 0})
+        stat['calls'] += 1
+        if self.trace:
+            current, peak = tracemalloc.get_traced_memory()
+            if self.frames:
+                self.frames[-1][1] = max(self.frames[-1][1], peak)
+            self.frames.append([current, current])
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            stat['wall'] += time.perf_counter() - start
+            if self.trace:
+                base, seen = self.frames.pop()
+                current, peak = tracemalloc.get_traced_memory()
+                peak = max(seen, peak)
+                stat['peak_kib'] = max(stat.get('peak_kib', 0), round((peak - base) / 1024, 1))
+                stat['retained_kib'] = max(stat.get('retained_kib', 0),
+                                           round((current - base) / 1024, 1))
+                if self.frames:
+                    self.frames[-1][1] = max(self.frames[-1][1], peak)
+                tracemalloc.reset_peak()
+
+    def wrap(self, name, func):
+        """Returns func wrapped so each call is recorded as a phase."""
+        @functools.wraps(func)
+        def recorded(*args, **kwargs):
+            with self.phase(name):
+                return func(*args, **kwargs)
+        return recorded
+
+@contextlib.contextmanager
+def instrumented(recorder):
+    """Temporarily wraps every phase with recorder."""
+    originals = [(owner, attr, getattr(owner, attr)) for owner, attr in PHASES]
+    try:
+        for owner, attr, func in originals:
+            setattr(owner, attr, recorder.wrap(attr, func))
+        yield
+    finally:
+        for owner, attr, func in originals:
+            setattr(owner, attr, func)
+
+def synthetic(num_teams, j_sets, t_pairs, divisions=0):
+    """Returns read_data-style (logic_params, tournament_name, io_params) for a generated roster.
+
+    divisions -- split the teams into this many divisions of uneven sizes (default 0: none)"""
+    def at(hour, minute=0):
+        return datetime(1, 1, 1, hour, minute)
+    def minutes(length):
+        return timedelta(minutes=length)
+
+    teams = [[1000 + i, f'Team {i}'] for i in range(num_teams)]
+    if divisions: #division k gets a share of the teams proportional to k + 1
+        weights = [(k + 1) / (divisions*(divisions + 1) / 2) for k in range(divisions)]
+        bounds = [round(num_teams*sum(weights[:k + 1])) for k in range(divisions)]
+        for i, team in enumerate(teams):
+            team.append(f'Division {next(k for k, bound in enumerate(bounds) if i < bound) + 1}')
+    rnd_names = ['Practice', 'Round 1', 'Round 2', 'Round 3']
+    t_names = [[f'Table {i + 1}'] for i in range(t_pairs)]
+    logic_params = (teams, bool(divisions), 'Interlaced', minutes(10), (at(8), minutes(15)),
+                    (at(8, 30), minutes(30)), (at(11), at(13), minutes(30)), at(9, 15), j_sets,
+                    False, (minutes(15), minutes(10)), (3, minutes(10)), len(rnd_names), t_pairs,
+                    False, num_teams*len(rnd_names), [minutes(10)] + 3*[minutes(8)])
+    rooms = [['Cafeteria'], ['Gym']]
+    rooms += [[f'{cat} {i + 1}' for i in range(j_sets)] for cat in ('P', 'RD', 'CV')]
+    rooms += [[f'{tbl[0]} {side}' for tbl in t_names for side in 'AB']]
+    event_names = ["Coaches' Meeting", 'Opening Ceremonies', 'Project', 'Robot Design',
+                   'Core Values'] + rnd_names
+    header = ['Team Number', 'Team'] + (['Division'] if divisions else [])
+    io_params = ([header] + teams, [], event_names, ['P', '1', '2', '3'], rooms, t_names)
+    name = f'synthetic_{num_teams}_{j_sets}_{t_pairs}' + (f'_{divisions}div' if divisions else '')
+    return logic_params, name, io_params
+
+def load(source):
+    """Reads (or generates) one input, returning the read_data-style results and the recorded
+    read_data phase.
+
+    source -- a path to an input workbook, or a (teams, judging sets, table pairs[, divisions])
+              tuple"""
+    recorder = Recorder(False)
+    with instrumented(recorder), warnings.catch_warnings():
+        warnings.filterwarnings("ignore", category=UserWarning)
+        loaded = schedule.read_data(source) if isinstance(source, str) else synthetic(*source)
+    return loaded, recorder.stats
+
+def run_once(loaded, trace, method=None):
+    """Schedules and exports one loaded input; returns the recorded phases.
+
+    loaded -- the (logic_params, tournament_name, io_params) of the input, as returned by load
+    trace -- whether to trace memory and enable the profiling counters
+    method -- the scheduling method to use instead of the input's own (default None)
+    Returns the phase stats, the judging summary (see judging) and a description of each of the
+    schedule's CONFLICTS."""
+    logic_params, _, io_params = loaded
+    recorder = Recorder(trace)
+    gc.collect() #so no pass is timed collecting garbage left by the one before
+    if trace:
+        tracemalloc.start()
+    else:
+        gc.disable() #as timeit does, so a collection's pause isn't charged to whichever phase
+    try:
+        with contextlib.ExitStack() as stack:
+            stack.enter_context(instrumented(recorder))
+            if trace:
+                stack.enter_context(profiling.profile())
+            stack.enter_context(contextlib.redirect_stdout(io.StringIO()))
+            stack.enter_context(warnings.catch_warnings())
+            warnings.filterwarnings("ignore", category=UserWarning)
+            if method:
+                logic_params = logic_params[:2] + (method,) + logic_params[3:]
+            with recorder.phase('schedule'):
+                tment = Tournament(*logic_params)
+                tment.schedule()
+            with recorder.phase('validate'):
+                found = validate(tment)
+            with recorder.phase('export'):
+                workbook = schedule.export(tment, *io_params)
+            with recorder.phase('save'):
+                workbook.save(io.BytesIO())
+    finally:
+        if trace:
+            tracemalloc.stop()
+        else:
+            gc.enable()
+    return recorder.stats, judging(tment), [schedule.describe(tment, violation)
+                                            for violation in found if violation.kind in CONFLICTS]
+
+def judging(tment):
+    """Returns the minutes from the first judging session's start to the last one's end, the
+    most teams any judging room sees, and how many teams share rooms with other divisions."""
+    start, end = tment.j_slots[0][0], tment.j_slots[-1][0] + tment.j_duration[0]
+    groups = [[team for team in teams if team is not None] for _, teams in tment.divs]
+    return {'span_minutes': (end - start) // timedelta(minutes=1),
+            'busiest_room': max(-(-len(teams) // rooms) for rooms, teams in tment.divs),
+            'mixed_teams': sum(len(teams) for teams in groups
+                               if len({team.div for team in teams}) > 1)}
+
+def run(sources, methods=(None,)):
+    """Returns {input name: {'phases': {phase: stats}, 'counters': {name: count}}} for each input.
+
+    Each input is read once and run with every method in methods (None for its own), and named
+    '<input> [<method>]' when a method is given. Reading is timed but not traced, so read_data
+    has no memory figures."""
+    import numpy, openpyxl.cell, openpyxl.styles #so the first input isn't timed loading them
+    results = {}
+    for source in sources:
+        loaded, read = load(source)
+        for method in methods:
+            name = os.path.basename(source) if isinstance(source, str) else loaded[1]
+            name += f' [{method}]' if method else ''
+            print(f'Benchmarking {name}', file=sys.stderr)
+            (timed, judged, conflicts), (traced, _, _) = run_once(loaded, False, method), \
+                                                         run_once(loaded, True, method)
+            phases = {phase: {'wall': round(stats['wall'], 4), 'calls': stats['calls'],
+                              'peak_kib': traced.get(phase, {}).get('peak_kib'),
+                              'retained_kib': traced.get(phase, {}).get('retained_kib')}
+                      for phase, stats in {**read, **timed}.items()}
+            results[name] = {'phases': phases, 'counters': dict(profiling.counters),
+                             'judging': judged, 'conflicts': conflicts}
+    return results
+
+def summary(results):
+    """Returns the results with only the time and memory of the SUMMARY_PHASES and the judging
+    summary of each input."""
+    return {name: {'phases': {phase: {key: value for key, value in stats.items() if key != 'calls'}
+                              for phase, stats in result['phases'].items()
+                              if phase in SUMMARY_PHASES},
+                   'judging': result['judging']}
+            for name, result in results.items()}
+
+def import_time(module='schedule', repeat=5):
+    """Returns the best time (in seconds) taken to import module in a fresh interpreter, and the
+    HEAVY_MODULES that importing it loaded."""
+    code = ("import sys, time; start = time.perf_counter(); import {}; "
+            "print(time.perf_counter() - start, *[m for m in {!r} if m in sys.modules])"
+            .format(module, HEAVY_MODULES))
+    here = os.path.dirname(os.path.abspath(__file__))
+    times = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, '-c', code], cwd=here, capture_output=True,
+                             text=True, check=True).stdout.split()
+        times.append(float(out[0]))
+    return min(times), out[1:]
+
+def regressions(results, baseline, threshold, min_seconds=0.05, min_kib=64):
+    """Returns messages for phases slower or larger than the baseline by more than threshold,
+    and for judging that runs longer than it did in the baseline.
+
+    Differences under min_seconds or min_kib are ignored as noise."""
+    found = []
+    for name, result in results.items():
+        span, base_span = (result.get('judging', {}).get('span_minutes'),
+                           baseline.get(name, {}).get('judging', {}).get('span_minutes'))
+        if span is not None and base_span is not None and span > base_span:
+            found.append(f"{name} judging: {span} minutes vs {base_span} minutes")
+        for phase, stats in result['phases'].items():
+            base = baseline.get(name, {}).get('phases', {}).get(phase)
+            if base is None:
+                continue
+            if stats['wall'] > base['wall']*(1 + threshold) and \
+                    stats['wall'] - base['wall'] > min_seconds:
+                found.append(f"{name} {phase}: {stats['wall']:.3f}s vs {base['wall']:.3f}s")
+            for memory in ('peak_kib', 'retained_kib'):
+                if stats.get(memory) and base.get(memory) and \
+                        stats[memory] > base[memory]*(1 + threshold) and \
+                        stats[memory] - base[memory] > min_kib:
+                    found.append(f"{name} {phase}: {stats[memory]} KiB vs {base[memory]} KiB "
+                                 f"{memory.split('_')[0]}")
+    return found
+
+def main(argv=None):
+    """Runs the benchmark from the command line; returns the process exit status."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('files', nargs='*', help="input workbooks (default: tests/*.xlsm)")
+    parser.add_argument('--synthetic', action='store_true',
+                        help="also run the generated rosters of 50 to 500 teams, some with "
+                             "divisions")
+    parser.add_argument('--roster', action='append', default=[],
+                        metavar='TEAMS,SETS,PAIRS[,DIVISIONS]',
+                        help="run a generated roster of the given size (repeatable)")
+    parser.add_argument('--method', action='append', choices=('Interlaced', 'Block'),
+                        help="schedule every input with this method instead of its own "
+                             "(repeatable, to compare methods)")
+    parser.add_argument('--output', help="write the JSON results to this file")
+    parser.add_argument('--baseline', help="compare against results saved by an earlier run")
+    parser.add_argument('--summary', action='store_true',
+                        help="print or save only the top-level phases and judging of each input, "
+                             "as in tests/benchmark_baseline.json")
+    parser.add_argument('--threshold', type=float, default=1.0,
+                        help="allowed fractional slowdown or growth over the baseline")
+    parser.add_argument('--import-budget', type=float, metavar='SECONDS',
+                        help="fail if importing schedule takes longer or loads a heavy dependency;"
+                             " runs only this check unless inputs are also given")
+    args = parser.parse_args(argv)
+
+    status = 0
+    if args.import_budget is not None:
+        seconds, loaded = import_time()
+        print(f'import schedule: {seconds:.3f}s (budget {args.import_budget:.3f}s)'
+              + (f", loaded {', '.join(loaded)}" if loaded else ''), file=sys.stderr)
+        status = int(seconds > args.import_budget or bool(loaded))
+        if not args.files and not args.roster and not args.synthetic:
+            return status
+
+    sources = args.files
+    if not sources and not args.roster and not args.synthetic:
+        sources = sorted(glob.glob(os.path.join(here, 'tests', '*.xlsm')))
+    sources += SYNTHETIC if args.synthetic else []
+    sources += [tuple(int(x) for x in roster.split(',')) for roster in args.roster]
+
+    results = run(sources, args.method or (None,))
+    if args.summary: #one line per input, so a changed figure shows up as a one-line diff
+        text = '{\n' + ',\n'.join(f'  {json.dumps(name)}: {json.dumps(result, sort_keys=True)}'
+                                   for name, result in sorted(summary(results).items())) + '\n}'
+    else:
+        text = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as fout:
+            fout.write(text + '\n')
+    else:
+        print(text)
+
+    for name, result in results.items():
+        for conflict in result['conflicts']:
+            print(f'Conflict: {name}: {conflict}', file=sys.stderr)
+            status = 1
+    if args.baseline:
+        with open(args.baseline) as fin:
+            found = regressions(results, json.load(fin), args.threshold)
+        for message in found:
+            print('Regression:', message, file=sys.stderr)
+        return 1 if found else status
+    return status
+
+if __name__ == "__main__":
+    sys.exit(main())
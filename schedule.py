@@ -1,32 +1,71 @@
 #!/usr/bin/env python3
-"""Module for use in scheduling one-day FLL tournaments."""
+"""Module for use in scheduling one-day FLL tournaments.
+
+openpyxl and tkinter are imported by the functions that use them, so importing this module (or
+running it headless) doesn't pay for the file dialog or the spreadsheet library up front."""
 from datetime import datetime, timedelta
+import argparse
+import itertools
 import re
 import os
 import sys
 import math
-import tkinter
-from tkinter import filedialog
-import pandas
-from numpy import isnan
-import openpyxl
-import openpyxl.styles as styles
-from openpyxl.utils import get_column_letter
 import warnings
 from scheduler.tournament import Tournament
+import scheduler.profiling as profiling
+from scheduler.sheet_styles import SheetRows, StyleRegistry, sheet_format
+from scheduler.cache import ScheduleCache, settings_key, restore_state
+from scheduler.compact import CompactSchedule
+from scheduler.validate import validate
 
-def read_data(fpath):
-    """Imports the team roster and scheduling settings from the input form."""
-    dfs = pandas.read_excel(fpath, sheet_name=["Team Information", "Input Form"], dtype=object)
+DATA_EXTENSIONS = ('.json', '.fllsched') #inputs treated as saved schedule data
 
-    team_sheet = dfs["Team Information"]
+def read_data(fpath):
+    """Imports the team roster and scheduling settings from the input form.
+
+    The workbook is opened once, read-only, and its sheets' values are passed to parse_input; the
+    'Team Information' sheet's format (see sheet_format) is added to the io_params it returns."""
+    import openpyxl
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", category=UserWarning)
+        workbook = openpyxl.load_workbook(fpath, read_only=True, data_only=True, keep_links=False)
+        try:
+            team_cells = list(workbook["Team Information"].iter_rows())
+            team_format = sheet_format(workbook["Team Information"], team_cells)
+            sheets = [[[_cell_value(cell.value) for cell in row] for row in team_cells],
+                      [[_cell_value(value) for value in row] for row in
+                       workbook["Input Form"].iter_rows(values_only=True)]]
+        finally:
+            workbook.close()
+    logic_params, tournament_name, io_params = parse_input(*sheets)
+    return logic_params, tournament_name, io_params + (team_format,)
+
+def _cell_value(value):
+    """Returns a worksheet value with blanks as None and whole-number floats as ints."""
+    if value == '':
+        return None
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+def _table(rows):
+    """Splits sheet rows into a header and the non-blank rows below it, padded to equal length."""
+    rows = [row for i, row in enumerate(rows) if i == 0 or any(v is not None for v in row)]
+    width = max((len(row) for row in rows), default=0)
+    rows = [list(row) + (width - len(row))*[None] for row in rows]
+    return (rows[0], rows[1:]) if rows else ([], [])
+
+def parse_input(team_rows, form_rows):
+    """Builds the scheduling settings from the values of the 'Team Information' and 'Input Form'
+    sheets, each given as a list of rows; returns (logic_params, tournament_name, io_params)."""
+    header, roster = _table(team_rows)
     team_columns = ["Team Number", "Team"]
-    if all([x in team_sheet.columns for x in team_columns]):
-        divisions = ("Division" in team_sheet.columns)
+    if all([x in header for x in team_columns]):
+        divisions = ("Division" in header)
         if divisions:
             team_columns += ["Division"]
-        teams = team_sheet.loc[:, team_columns].values
-        roster_cols = [list(team_sheet.columns).index(cat) + 1 for cat in team_columns]
+        roster_cols = [header.index(cat) + 1 for cat in team_columns]
+        teams = [[row[col - 1] for col in roster_cols] for row in roster]
         #any time we print full team data just print the number and look the other info up
         team_info = [f"=index(indirect(\"'Team Information'!C{cat}\", false),"
                       f"match(indirect(\"RC[-{offset + 1}]\", false), "
@@ -37,11 +76,16 @@ def read_data(fpath):
     else:
         raise KeyError("Could not find columns 'Team Number' and 'Team' in 'Team Information'")
 
-    param_sheet = dfs["Input Form"]
-    if any([x not in param_sheet.columns for x in ("key", "answer")]):
+    header, form = _table(form_rows)
+    if any([x not in header for x in ("key", "answer")]):
         raise KeyError("Could not find columns 'key' and 'answer' in sheet 'Input Form'")
-    param_sheet = param_sheet.set_index("key")
-    param = dict(param_sheet.loc[:, "answer"].items())
+    key_col, answer_col = header.index("key"), header.index("answer")
+    param_rows = {row[key_col]: row[:key_col] + row[key_col + 1:] for row in form
+                  if row[key_col] is not None}
+    param = {key: row[answer_col - (answer_col > key_col)] for key, row in param_rows.items()}
+    def listed(key):
+        """Returns the values given after the question text in a row of the input form."""
+        return [value for value in param_rows[key] if value is not None][1:]
 
     try: #there are a lot of settings. this appears to be necessary
         tournament_name = param["tournament_name"]
@@ -49,15 +93,15 @@ def read_data(fpath):
         travel = timedelta(minutes=param["travel_time"])
         event_names = ["Coaches' Meeting", 'Opening Ceremonies',
                        'Project', 'Robot Design', 'Core Values']
-        rnd_abbrevs = list(map(str, param_sheet.loc["t_round_names"].dropna().values.tolist()[1:]))
+        rnd_abbrevs = list(map(str, listed("t_round_names")))
         t_rounds = len(rnd_abbrevs)
         event_names += rnd_abbrevs
         for word in ('\\b' + word + '\\b' for word in ("round", "rnd", "rd")):
             rnd_abbrevs = [re.sub(word, '', rnd, flags=re.I) for rnd in rnd_abbrevs]
         rnd_abbrevs = [rnd.strip()[0] for rnd in rnd_abbrevs]
         
-        rnd_abbrevs = [guessed if pandas.isnull(given) else str(given) for guessed, given in
-                       zip(rnd_abbrevs, param_sheet.loc["t_round_abbreviations"].values[1:])]
+        rnd_abbrevs = [guessed if given is None else str(given) for guessed, given in
+                       zip(rnd_abbrevs, param_rows["t_round_abbreviations"][1:])]
 
         coach_meet = (datetime.combine(datetime(1, 1, 1), param["coach_start"]),
                       timedelta(minutes=param["coach_duration"]))
@@ -70,8 +114,7 @@ def read_data(fpath):
         j_start = datetime.combine(datetime(1, 1, 1), param["j_start"])
         j_sets = param["j_sets"]
         rooms = [[param["coach_room"]], [param["opening_room"]]]
-        rooms += [param_sheet.loc[key].dropna().values.tolist()[1:]
-                  for key in ("j_project_rooms", "j_robot_rooms", "j_values_rooms")]
+        rooms += [listed(key) for key in ("j_project_rooms", "j_robot_rooms", "j_values_rooms")]
         j_calib = (param["j_calib"] == "Yes") and not divisions
         j_duration = (timedelta(minutes=param["j_duration"]), timedelta(minutes=10))
         j_breaks = (param["j_consec"], timedelta(minutes=param["j_break"]))
@@ -81,12 +124,12 @@ def read_data(fpath):
         t_pairs = param["t_pairs"]
         t_stagger = (param["t_stagger"] == 'Yes')
         t_consec = param["t_consec"] or len(teams)*t_rounds
-        t_names = param_sheet.loc[["t_pair_names", "t_pair_names_second"]].iloc[:, 1:1 + t_pairs].T
-        t_names = [[str(tbl) for tbl in row if not pandas.isnull(tbl)] for row in t_names.values]
+        t_names = zip(*[param_rows[key][1:1 + t_pairs] for key in ("t_pair_names",
+                                                                    "t_pair_names_second")])
+        t_names = [[str(tbl) for tbl in row if tbl is not None] for row in t_names]
         rooms += [sum([tbls if len(tbls) > 1 else [tbls[0] + ' A', tbls[0] + ' B']
                        for tbls in t_names], [])]
-        t_duration = [timedelta(minutes=x) for x in
-                      param_sheet.loc["t_durations"].dropna().values.tolist()[1:]]
+        t_duration = [timedelta(minutes=x) for x in listed("t_durations")]
 
     except KeyError as excep:
         raise KeyError(str(excep) + " not found in 'key' column in sheet 'Input Form'")
@@ -94,26 +137,51 @@ def read_data(fpath):
     return ((teams, divisions, scheduling_method, travel, coach_meet, opening, lunch, j_start,
              j_sets, j_calib, j_duration, j_breaks, t_rounds, t_pairs, t_stagger, t_consec,
              t_duration), tournament_name,
-             (team_info, event_names, rnd_abbrevs, rooms, t_names))
+             (team_rows, team_info, event_names, rnd_abbrevs, rooms, t_names))
+
+def export(tment, team_rows, team_info, event_names, rnd_abbrevs, rooms, tnames, team_format=None):
+    """Exports schedule to a new write-only workbook, which is returned for saving.
 
-def export(tment, workbook, team_info, event_names, rnd_abbrevs, rooms, tnames):
-    """Exports schedule to an xlsx file; uses the tournament name for the file name."""
+    team_rows -- the rows of the input's 'Team Information' sheet, which the views refer to
+    team_format -- that sheet's column widths and cell styles, as from sheet_format, to copy
+                   (default None: columns fit their values and the header is bold)"""
+    import openpyxl
+    from openpyxl.utils import get_column_letter
     print("Exporting schedule")
-    for sheet in [ws for ws in workbook.sheetnames if ws != 'Team Information']:
-        del workbook[sheet]
+    registry = StyleRegistry(openpyxl.Workbook(write_only=True))
+    team_sheet = registry.workbook.create_sheet('Team Information')
+    if team_format:
+        for first, last, width, hidden in team_format['columns']:
+            dimension = team_sheet.column_dimensions[get_column_letter(first)]
+            dimension.min, dimension.max, dimension.width, dimension.hidden = \
+                    first, last, width, hidden
+        styles, cells = team_format['styles'], team_format['cells']
+        for i, row in enumerate(team_rows): #added teams' rows are past the styled ones
+            team_sheet.append([value if style is None else
+                               registry.copied_cell(team_sheet, value, styles[style]) for
+                               value, style in itertools.zip_longest(
+                                   row, cells[i] if i < len(cells) else [])])
+    else:
+        team_rows = SheetRows(team_rows)
+        for col, width in enumerate(team_rows.widths, 1):
+            if width > 2: #leave empty columns alone
+                team_sheet.column_dimensions[get_column_letter(col)].width = width
+        for i, row in enumerate(team_rows):
+            if i == 0:
+                row = [value if value is None else registry.cell(team_sheet, value, bold=True)
+                       for value in row]
+            team_sheet.append(row)
 
     time_fmt = "%{}I:%M %p".format('#' if sys.platform == "win32" else '-')
-    export_judge_views(tment, workbook, time_fmt, team_info, event_names, rooms)
-    export_table_views(tment, workbook, time_fmt, team_info, rnd_abbrevs, rooms, tnames)
-    export_team_views(tment, workbook, time_fmt, team_info, event_names, rooms)
+    export_judge_views(tment, registry, time_fmt, team_info, event_names, rooms)
+    export_table_views(tment, registry, time_fmt, team_info, rnd_abbrevs, rooms, tnames)
+    export_team_views(tment, registry, time_fmt, team_info, event_names, rooms)
+    return registry.workbook
 
-def export_judge_views(tment, workbook, time_fmt, team_info, event_names, rooms):
+def export_judge_views(tment, registry, time_fmt, team_info, event_names, rooms):
     """Adds the four judging-focused sheets to the output workbook."""
-    thin = styles.Side(border_style='thin', color='000000')
-    thick = styles.Side(border_style='thick', color='000000')
     team_width = 1 + len(team_info)
-
-    sheets = [workbook.create_sheet(name) for name in ["Judging Rooms"] + event_names[2:5]]
+    set_width = team_width*tment.j_sets
 
     #writing data
     rows = [[['']], [['']]]
@@ -126,80 +194,76 @@ def export_judge_views(tment, workbook, time_fmt, team_info, event_names, rooms)
         if teams is not None:
             teams = [[None if t is None else tment.teams[t] for t in cat] for cat in teams]
             if len(teams[0]) == 1 and tment.j_calib:
-                rows[-1] += [[teams[i][0].num] + team_info
+                rows[-1] += [(['']*(team_width - 1) + ['None'] if teams[i][0] is None
+                              else [teams[i][0].num] + team_info)
                              + ["all {} judges in {}".format(event_names[i + 2].lower(),
                                                              rooms[i + 2][0])]
                              + (team_width*(tment.j_sets - 1) - 1)*[''] for i in range(3)]
             else:
                 rows[-1] += [sum([['']*(team_width - 1) + ['None'] if team is None else
                                   [team.num] + team_info for team in cat], []) for cat in teams]
-    for row in rows:
-        sheets[0].append(sum(row, []))
-        for i in range(3):
-            sheets[i + 1].append(row[0] + (row[i + 1] if len(row) > 1 else []))
+    sheets = [SheetRows((sum(row, []) for row in rows), 4)]
+    sheets += [SheetRows((row[0] + (row[i + 1] if len(row) > 1 else []) for row in rows), 4)
+               for i in range(3)]
 
     #formatting - borders, cell merges, striped shading, etc
     col_sizes = [1 + max(len(str(text)) for text in cat) for cat in
                  zip(*[team.info(tment.divisions) for team in tment.teams])]
     col_sizes[1] += 5*tment.divisions
-    for sheet in sheets:
-        basic_sheet_format(sheet, 4)
-        for col in list(sheet.columns)[1:]:
-            sheet.column_dimensions[get_column_letter(col[0].column)].width =\
-                    col_sizes[(col[0].column - 2) % len(col_sizes)]
-        sheet_borders(sheet, ((styles.Border(left=thick), team_width*tment.j_sets, 2, 0),
-                              (styles.Border(left=thin), team_width, 2, 1 + 2*tment.j_calib)))
-
-        for i in range((len(list(sheet.columns)) - 1) // (team_width*tment.j_sets)):
-            sheet.cell(row=1, column=team_width*tment.j_sets*i + 2).font = styles.Font(bold=True)
-            sheet.merge_cells(start_row=1, start_column=2 + i*team_width*tment.j_sets,
-                              end_row=1, end_column=1 + (i + 1)*team_width*tment.j_sets)
-            for j in range(tment.j_sets):
-                sheet.merge_cells(start_row=2, start_column=team_width*(tment.j_sets*i + j) + 2,
-                                  end_row=2, end_column=team_width*(tment.j_sets*i + j + 1) + 1)
+    def border(row, col):
+        if (col - 2) % set_width == 0:
+            return ('left', 'thick')
+        if (col - 2) % team_width == 0 and row > 1 + 2*tment.j_calib:
+            return ('left', 'thin')
+        return None
+
+    for name, sheet_rows in zip(["Judging Rooms"] + event_names[2:5], sheets):
+        widths = list(sheet_rows.widths)
+        widths[1:] = [col_sizes[(col - 2) % len(col_sizes)] for col in range(2, len(widths) + 1)]
+        merges = []
+        for i in range((len(widths) - 1) // set_width):
+            merges.append((1, 2 + i*set_width, 1 + (i + 1)*set_width))
+            merges += [(2, team_width*(tment.j_sets*i + j) + 2,
+                        team_width*(tment.j_sets*i + j + 1) + 1) for j in range(tment.j_sets)]
             if tment.j_calib:
-                sheet.merge_cells(start_row=3, start_column=2 + team_width*(tment.j_sets*i + 1),
-                                  end_row=3, end_column=1 + team_width*(tment.j_sets*(i + 1)))
+                merges.append((3, 2 + team_width*(tment.j_sets*i + 1), 1 + set_width*(i + 1)))
+        write_sheet(registry, name, sheet_rows, widths, merges, border)
 
-def export_table_views(tment, workbook, time_fmt, team_info, rnd_abbrevs, rooms, tnames):
+def export_table_views(tment, registry, time_fmt, team_info, rnd_abbrevs, rooms, tnames):
     """Adds the competition table focused sheets to the output workbook."""
-    thin = styles.Side(border_style='thin', color='000000')
-    thick = styles.Side(border_style='thick', color='000000')
     team_width = 2 + len(team_info)
     space = 2
     split = 1 + 2*team_width*((tment.t_pairs + 1) // 2)
     staggered = [tment.t_stagger and i > (tment.t_pairs - 1) // 2 for i in range(tment.t_pairs)]
 
     #writing data
-    sheet_overall = workbook.create_sheet("Competition Tables")
     header = sum([[tbl] + (team_width - 1)*[''] for tbl in rooms[5]], [''])
     header[split:split] = tment.t_stagger*(space + 1)*['']
-    sheet_overall.append(header)
-    t_pair_sheets = [workbook.create_sheet('-'.join(tbls)) for tbls in tnames]
-    for t_pair in range(tment.t_pairs):
-        t_pair_sheets[t_pair]\
-                .append([''] + header[2*team_width*t_pair + 1 + staggered[t_pair]*(space + 1):
-                                      2*team_width*(t_pair + 1) + staggered[t_pair]*(space + 1)])
+    overall = SheetRows([header], 2)
+    t_pair_rows = [SheetRows([[''] + header[2*team_width*t_pair + 1 + staggered[t_pair]*(space + 1):
+                                            2*team_width*(t_pair + 1)
+                                            + staggered[t_pair]*(space + 1)]], 2)
+                   for t_pair in range(tment.t_pairs)]
 
     for slot in tment.t_slots:
         if slot is None:
-            for sheet in [sheet for sheet in t_pair_sheets + [sheet_overall] for i in range(2)]:
-                sheet.append([''])
+            for sheet_rows in t_pair_rows + [overall]:
+                sheet_rows += [[''], ['']]
         elif all([team is None for team in slot[2]]):
-            sheet_overall.append([slot[0][0].strftime(time_fmt)] + tment.t_stagger*((split + 1)*[''] +
-                                 [slot[0][1].strftime(time_fmt)]))
-            for i, sheet in enumerate(t_pair_sheets):
-                sheet.append([slot[0][staggered[i]].strftime(time_fmt)])
+            overall.append([slot[0][0].strftime(time_fmt)] + tment.t_stagger*((split + 1)*[''] +
+                           [slot[0][1].strftime(time_fmt)]))
+            for i, sheet_rows in enumerate(t_pair_rows):
+                sheet_rows.append([slot[0][staggered[i]].strftime(time_fmt)])
         else:
             line = sum([(team_width - 1)*[''] + ['None'] if t is None else
                         [rnd_abbrevs[rnd], tment.teams[t].num] + team_info for t, rnd in slot[2]],
                        [slot[0][0].strftime(time_fmt)])
             line[split:split] = space*[''] + [slot[0][1].strftime(time_fmt)] if tment.t_stagger else []
-            sheet_overall.append(line)
+            overall.append(line)
             for t_pair in range(tment.t_pairs):
                 time_str = slot[0][staggered[t_pair]].strftime(time_fmt)
                 ls_start = 2*team_width*t_pair + (space + 1)*staggered[t_pair] + 1
-                t_pair_sheets[t_pair].append([time_str] + line[ls_start:ls_start + 2*team_width])
+                t_pair_rows[t_pair].append([time_str] + line[ls_start:ls_start + 2*team_width])
 
     #formatting - borders, cell merges, striped shading, etc
     col_wide = [1 + max(len(str(rnd)) for rnd in rnd_abbrevs)]
@@ -209,134 +273,311 @@ def export_table_views(tment, workbook, time_fmt, team_info, rnd_abbrevs, rooms,
         col_wide[2] += 4
     col_wide = [-1] + 2*tment.t_pairs*col_wide
     col_wide[split + 1:split + 1] = tment.t_stagger*(space*[10] + [-1])
-    for sheet in [sheet_overall] + t_pair_sheets:
-        basic_sheet_format(sheet, 2)
-        for col, width in [(col, width) for col, width in enumerate(col_wide, 1) if width > 0]:
-            sheet.column_dimensions[get_column_letter(col)].width = width
-        thick_border = [1 + 2*i*team_width for i in range(tment.t_pairs + 1)]
-        if tment.t_stagger:
-            thick_border = [1 + 2*i*team_width for i in range(math.ceil(tment.t_pairs / 2) + 1)]
-            thick_border += [val + thick_border[-1] + space for val in thick_border]
-        for cell in [cell for row in sheet for cell in row]:
-            if tment.t_stagger and split < cell.column <= split + space:
-                cell.fill = openpyxl.styles.PatternFill(None)
-            elif cell.column in thick_border or cell.column + team_width in thick_border:
-                cell.border = styles.Border(right=thick if cell.column in thick_border else thin)
-        for i in range(2*tment.t_pairs):
-            start_col = 2 + i*team_width + (space + 1)*staggered[i // 2]
-            sheet.merge_cells(start_row=1, start_column=start_col,
-                              end_row=1, end_column=start_col + team_width - 1)
-
-def export_team_views(tment, workbook, time_fmt, team_info, event_names, rooms):
+    thick_border = [1 + 2*i*team_width for i in range(tment.t_pairs + 1)]
+    if tment.t_stagger:
+        thick_border = [1 + 2*i*team_width for i in range(math.ceil(tment.t_pairs / 2) + 1)]
+        thick_border += [val + thick_border[-1] + space for val in thick_border]
+    gap = range(split + 1, split + space + 1) if tment.t_stagger else range(0)
+    def border(row, col):
+        if col in gap:
+            return None
+        if col in thick_border:
+            return ('right', 'thick')
+        if col + team_width in thick_border:
+            return ('right', 'thin')
+        return None
+
+    merges = []
+    for i in range(2*tment.t_pairs):
+        start_col = 2 + i*team_width + (space + 1)*staggered[i // 2]
+        merges.append((1, start_col, start_col + team_width - 1))
+    names = ["Competition Tables"] + ['-'.join(tbls) for tbls in tnames]
+    for name, sheet_rows in zip(names, [overall] + t_pair_rows):
+        widths = sheet_rows.widths + (len(col_wide) - len(sheet_rows.widths))*[None]
+        widths = [width if wide <= 0 else wide for width, wide
+                  in zip(widths, col_wide + (len(widths) - len(col_wide))*[-1])]
+        write_sheet(registry, name, sheet_rows, widths, merges, border, gap)
+
+def export_team_views(tment, registry, time_fmt, team_info, event_names, rooms):
     """Adds event-sorted and time-sorted team-focused views to the output workbook."""
     #writing data
-    ws_chron = workbook.create_sheet("Team View (Chronological)")
-    ws_event = workbook.create_sheet("Team View (Event)")
     team_header = ['Team Number'] + (['Division'] if tment.divisions else []) + ['Team Name']
-    ws_chron.append(team_header + ['Event ' + str(i + 1) for i in range(len(event_names))])
-    ws_event.append(team_header + event_names[2:])
+    chron = SheetRows([team_header + ['Event ' + str(i + 1) for i in range(len(event_names))]])
+    event = SheetRows([team_header + event_names[2:]])
 
     for team in sorted(tment.teams, key=lambda t: t.num):
-        ws_chron.append([team.num] + team_info
-                        + [f'{event_names[cat]} at {time.strftime(time_fmt)} for {duration}, '
-                           + rooms[min(5, cat)][loc]
-                           for (time, duration, cat, loc) in team.events])
-        ws_event.append([team.num] + team_info
-                        + [f'{time.strftime(time_fmt)}, {rooms[min(5, cat)][loc]}'
-                           for (time, length, cat, loc)
-                           in sorted(team.events, key=lambda x: x[2])[2:]])
+        chron.append([team.num] + team_info
+                     + [f'{event_names[cat]} at {time.strftime(time_fmt)} for {duration}, '
+                        + rooms[min(5, cat)][loc]
+                        for (time, duration, cat, loc) in team.events])
+        event.append([team.num] + team_info
+                     + [f'{time.strftime(time_fmt)}, {rooms[min(5, cat)][loc]}'
+                        for (time, length, cat, loc)
+                        in sorted(team.events, key=lambda x: x[2])[2:]])
 
     #formatting - borders, cell merges, striped shading, etc
     col_size = 1 + max(len(team.name) for team in tment.teams)
-    for sheet in (ws_chron, ws_event):
-        basic_sheet_format(sheet)
-        for col in sheet.columns:
-            if col[0].column == 2 + tment.divisions:
-                sheet.column_dimensions[get_column_letter(col[0].column)].width = col_size
-
-def basic_sheet_format(sheet, start=0):
-    """bolds the top row, stripes the rows, and sets column widths"""
-    for col in sheet.columns:
-        col[0].font = openpyxl.styles.Font(bold=True)
-        length = 2 + max((len(str(cell.value)) for cell in col[start:]
-                          if cell.value and str(cell.value)[0] != '='), default=0)
-        sheet.column_dimensions[openpyxl.utils.get_column_letter(col[0].column)].width = length
-    row_counter = 0
-    for row in sheet.rows:
-        row[0].alignment = openpyxl.styles.Alignment(horizontal='right')
-        row_counter = (row[0].value != '')*(row_counter + 1)
-        for cell in row:
-            cell.alignment = openpyxl.styles.Alignment(horizontal='center')
-            if cell.row > 1 and row_counter % 2:
-                cell.fill = openpyxl.styles.PatternFill('solid', fgColor='DDDDDD')
-
-def sheet_borders(sheet, borders=()):
-    """Formats worksheet to add specified borders at a given period and offset."""
-    for row in sheet.rows:
-        for cell in row:
-            for border, period, offset, start_row in borders[::-1]:
-                if (cell.column - offset) % period == 0 and cell.row > start_row:
-                    cell.border = border
-
-def generate_schedule():
+    for name, sheet_rows in (("Team View (Chronological)", chron), ("Team View (Event)", event)):
+        widths = list(sheet_rows.widths)
+        if len(widths) > 1 + tment.divisions:
+            widths[1 + tment.divisions] = col_size
+        write_sheet(registry, name, sheet_rows, widths)
+
+def write_sheet(registry, name, rows, widths, merges=(), border=None, unshaded=()):
+    """Streams SheetRows into a new write-only sheet with a bold header, centered cells and shading on
+    alternate rows (restarting after each row beginning with '').
+
+    widths -- the width of each column from column A; None leaves a column's width alone
+    merges -- (row, start column, end column) ranges merged within a row
+    border -- a function of (row, column) returning None or a (side, weight) border
+    unshaded -- columns excluded from the row shading"""
+    from openpyxl.utils import get_column_letter
+    from openpyxl.worksheet.cell_range import CellRange
+    sheet = registry.workbook.create_sheet(name)
+    for col, width in enumerate(widths, 1):
+        if width is not None:
+            sheet.column_dimensions[get_column_letter(col)].width = width
+    num_cols = len(rows.widths)
+    counter = 0
+    for row_num, row in enumerate(rows, 1):
+        counter = (row[0] != '')*(counter + 1)
+        shaded = row_num > 1 and counter % 2 == 1
+        sheet.append([registry.cell(sheet, value, row_num == 1, shaded and col not in unshaded,
+                                    border(row_num, col) if border else None)
+                      for col, value in enumerate(row + (num_cols - len(row))*[None], 1)])
+    for row, start_col, end_col in merges:
+        sheet.merged_cells.add(CellRange(min_row=row, min_col=start_col, max_row=row,
+                                         max_col=end_col))
+
+def schedule_problems(tment):
+    """Returns {team: [descriptions]} for teams whose events break a rule (see
+    scheduler.validate), each problem listed under the first team involved."""
+    problems = {}
+    for violation in validate(tment):
+        team = tment.teams[violation.teams[0]]
+        problems.setdefault(team, []).append(describe(tment, violation))
+    return problems
+
+def describe(tment, violation):
+    """Returns a sentence describing a Violation found in a Tournament."""
+    teams = [tment.teams[team] for team in violation.teams]
+    when = violation.start.strftime('%r') if violation.start else None
+    if violation.kind in ('room', 'table'):
+        place = f'table {violation.loc + 1}' if violation.kind == 'table' else \
+                f'judging room {violation.loc + 1} of event type {violation.activity}'
+        return f'{teams[1]} is at {place} at {when}, {violation.detail} before {teams[0]} leaves'
+    if violation.kind == 'travel':
+        return f'{teams[0]} has two events separated by only {violation.detail}'
+    if violation.kind == 'lunch':
+        return (f'{teams[0]} does not have {tment.lunch[2]} for lunch between '
+                f"{tment.lunch[0].strftime('%r')} and {tment.lunch[1].strftime('%r')}")
+    return f'{teams[0]} has no event of type {violation.activity}'
+
+def save_schedule(workbook, fpath, name, out_dir=None, keep_existing=False):
+    """Saves an exported workbook as <name>_schedule.xlsx, numbering it if the file is locked.
+
+    fpath -- the input workbook, whose directory is used unless out_dir is given
+    keep_existing -- also number it rather than replace a file already there (default False)
+    Returns the path of the saved workbook."""
+    outfpath = os.path.join(out_dir or os.path.dirname(fpath),
+                            name.lower().replace(' ', '_') + '_schedule{}.xlsx')
+    saved, attempts = False, 0
+    while not saved:
+        try:
+            final_fout = outfpath.format(' ({})'.format(attempts) if attempts else '')
+            if keep_existing and os.path.exists(final_fout):
+                attempts += 1
+                continue
+            workbook.save(final_fout)
+            saved = True
+        except PermissionError:
+            attempts += 1
+    return final_fout
+
+def run_tournament(logic_params, cache=None, refresh=False, table_time_limit=None,
+                   improve_time_limit=None, workers=1):
+    """Returns a scheduled Tournament, reusing the cached schedule for the same settings if any.
+
+    cache -- a ScheduleCache to look schedules up in and store them to (default None)
+    refresh -- reschedule even if a schedule is cached, replacing it (default False)
+    table_time_limit -- seconds to spend optimizing table assignments (default None: greedy only)
+    improve_time_limit -- seconds to spend improving the finished schedule by local search
+                          (default None: only repair broken travel or lunch rules)
+    workers -- the number of processes searching table schedules (default 1); the schedule found
+               is the same for any number"""
+    tment = Tournament(*logic_params, workers=workers, table_time_limit=table_time_limit,
+                       improve_time_limit=improve_time_limit)
+    key = None if cache is None else settings_key(logic_params, table_time_limit=table_time_limit,
+                                                  improve_time_limit=improve_time_limit)
+    saved = None if key is None or refresh else cache.get(key)
+    if profiling.enabled and key is not None:
+        profiling.count('schedule cache hits' if saved is not None else 'schedule cache misses')
+    if saved is None:
+        tment.schedule()
+        if key is not None:
+            cache.put(key, CompactSchedule.from_tournament(tment, logic_params, None, None))
+    else:
+        print("Reusing the cached schedule for these settings")
+        restore_state(tment, saved.state())
+    return tment
+
+def create_schedule(fpath, cache=None, refresh=False, data_path=None, table_time_limit=None,
+                    improve_time_limit=None, workers=1):
+    """Reads an input workbook, schedules the tournament, and saves the exported schedule.
+
+    cache, refresh, table_time_limit, improve_time_limit, workers -- as for run_tournament
+    data_path -- also save the schedule as a CompactSchedule here (default None)
+    Returns the path of the saved workbook."""
+    logic_params, tournament_name, io_params = read_data(fpath)
+    tment = run_tournament(logic_params, cache, refresh, table_time_limit, improve_time_limit,
+                           workers)
+    if data_path:
+        CompactSchedule.from_tournament(tment, logic_params, tournament_name,
+                                        io_params).save(data_path)
+        print('Schedule data saved: {}'.format(data_path))
+
+    problems = schedule_problems(tment)
+    for team, descriptions in problems.items():
+        print('\n'.join(descriptions))
+        team_sched = [f'\tEvent type {ev[2]} at {ev[0].strftime("%r")} for {ev[1]}'
+                      for ev in team.events]
+        print('\n'.join(team_sched), '\n')
+    if problems:
+        print("That shouldn't be happening - you've hit a bug.",
+              "Can you send me a copy of your input sheet? Thanks.")
+
+    final_fout = save_schedule(export(tment, *io_params), fpath, tournament_name)
+    print('Schedule saved: {}'.format(final_fout))
+    return final_fout
+
+def reexport_schedule(data_path, drop=(), add=(), save_path=None, in_place=False):
+    """Exports a schedule saved as a CompactSchedule again, without rescheduling.
+
+    drop, add -- teams to remove and add first, as for Tournament.update_roster (default none)
+    save_path -- also save the schedule data, with any roster changes, here (default None: only
+                 when the roster changes, to a new file beside data_path; see updated_data_path)
+    in_place -- save roster changes back over data_path instead (default False)
+    When the roster changes, the workbook is numbered rather than replacing an earlier export.
+    Returns the path of the saved workbook."""
+    saved = CompactSchedule.load(data_path)
+    tment, tournament_name, io_params = saved.to_tournament()
+    if drop or add:
+        tment.update_roster(drop, add)
+        io_params = [add_roster_rows(io_params[0], add)] + list(io_params[1:])
+        for descriptions in schedule_problems(tment).values():
+            print('\n'.join(descriptions))
+        save_path = save_path or (data_path if in_place else updated_data_path(data_path))
+    if save_path:
+        CompactSchedule.from_tournament(tment, saved.meta['logic_params'], tournament_name,
+                                        io_params).save(save_path)
+        print('Schedule data saved: {}'.format(save_path))
+    final_fout = save_schedule(export(tment, *io_params), data_path, tournament_name,
+                               keep_existing=bool(drop or add))
+    print('Schedule saved: {}'.format(final_fout))
+    return final_fout
+
+def updated_data_path(data_path):
+    """Returns <name>-updated beside saved schedule data, with its extension, numbered if that
+    file already exists so that no earlier data is replaced."""
+    root, ext = os.path.splitext(data_path)
+    fpath, attempts = root + '-updated' + ext, 0
+    while os.path.exists(fpath):
+        attempts += 1
+        fpath = '{}-updated ({}){}'.format(root, attempts, ext)
+    return fpath
+
+def add_roster_rows(team_rows, add):
+    """Returns the rows of the 'Team Information' sheet with a row for each added team.
+
+    add -- a (number, name[, division]) row for each team, as for Tournament.update_roster"""
+    header = team_rows[0]
+    columns = [header.index(name) for name in ("Team Number", "Team", "Division") if name in header]
+    rows = [list(row) for row in team_rows]
+    for team in add:
+        rows.append(len(header)*[None])
+        for col, value in zip(columns, [int(team[0])] + list(team[1:])):
+            rows[-1][col] = value
+    return rows
+
+def generate_schedule(argv=None):
     """Top-most level function; gets a file, reads and schedules for it, then exports the result."""
+    parser = argparse.ArgumentParser(description="Generates a schedule for an FLL tournament.")
+    parser.add_argument('file', nargs='?', help="the input workbook, or schedule data saved with "
+                                                "--save-data to export again (default: ask with "
+                                                "a dialog)")
+    parser.add_argument('--headless', action='store_true',
+                        help="never open a file dialog or wait for a key press (for scripts)")
+    parser.add_argument('--cache', action='store_true',
+                        help="reuse a finished schedule saved for the same settings, and save "
+                             "new ones, in an on-disk cache")
+    parser.add_argument('--invalidate-cache', action='store_true',
+                        help="with --cache, reschedule even if these settings are cached, "
+                             "replacing the entry")
+    parser.add_argument('--cache-dir', help="where schedules are cached, implying --cache "
+                                            "(default: a per-user cache directory)")
+    parser.add_argument('--save-data', metavar='PATH',
+                        help="also save the schedule data, as JSON if PATH ends in .json and in "
+                             "a compact binary format otherwise; with --drop or --add, where to "
+                             "save the changed data (default: a new <name>-updated file)")
+    parser.add_argument('--optimize-tables', type=float, metavar='SECONDS',
+                        help="spend up to SECONDS assigning tables for all matches at once, "
+                             "reporting the cost found against a lower bound")
+    parser.add_argument('--improve', type=float, metavar='SECONDS',
+                        help="spend up to SECONDS improving the finished schedule by swapping "
+                             "judging sessions, teams between matches, and whole matches")
+    parser.add_argument('--workers', type=int, default=1, metavar='N',
+                        help="search table schedules on N processes (the schedule is the same)")
+    parser.add_argument('--drop', type=int, action='append', default=[], metavar='NUM',
+                        help="with saved schedule data, remove this team without moving any "
+                             "other (repeatable)")
+    parser.add_argument('--add', nargs='+', action='append', default=[], metavar='VALUE',
+                        help="with saved schedule data, add a team given as NUM NAME [DIVISION] "
+                             "in seats left empty, without moving any other (repeatable)")
+    parser.add_argument('--in-place', action='store_true',
+                        help="with --drop or --add, save the changed data back over the input "
+                             "file instead of to a new one")
+    parser.add_argument('--profile', metavar='PSTATS', help="write a cProfile dump of the run")
+    parser.add_argument('--trace', metavar='JSON', help="write a Chrome trace-event file of the run")
+    args = parser.parse_args(argv)
+    if args.headless and args.file is None:
+        parser.error("an input workbook is required with --headless")
+    if any(not 2 <= len(team) <= 3 for team in args.add):
+        parser.error("--add takes a team number, a name and optionally a division")
+    cache = ScheduleCache(args.cache_dir) if args.cache or args.cache_dir else None
     try:
-        if len(sys.argv) == 1:
+        if args.file is None:
+            import tkinter
+            from tkinter import filedialog
             root = tkinter.Tk()
             root.withdraw()
             fpath = filedialog.askopenfilename(initialdir=os.path.dirname(os.path.abspath(__file__)),
                                                filetypes=[("Excel files", "*.xls *.xlsm *.xlsx")])
             root.destroy()
-        elif len(sys.argv) == 2:
-            fpath = sys.argv[1]
         else:
-            raise SystemExit("{} only accepts either zero or one files as input".format(sys.argv[0]))
-
-        logic_params, tournament_name, io_params = read_data(fpath)
-        tment = Tournament(*logic_params)
-        tment.schedule()
-
-        error = False
-        for team in tment.teams:
-            t_error = False
-            if team.closest_events() < tment.travel:
-                t_error = True
-                print(f'{team} has two events separated by only {team.closest_events()}')
-            if team.next_avail(tment.lunch[0], tment.lunch[2], timedelta(0)) > tment.lunch[1]:
-                t_error = True
-                print(f'{team} does not have {tment.lunch[2]} for lunch between',
-                      f"{tment.lunch[0].strftime('%r')} and {tment.lunch[1].strftime('%r')}")
-            if t_error:
-                error = True
-                team_sched = [f'\tEvent type {ev[2]} at {ev[0].strftime("%r")} for {ev[1]}'
-                              for ev in team.events]
-                print('\n'.join(team_sched), '\n')
-        if error:
-            print("That shouldn't be happening - you've hit a bug.",
-                  "Can you send me a copy of your input sheet? Thanks.")
-
-        with warnings.catch_warnings():
-            warnings.filterwarnings("ignore", category=UserWarning)
-            workbook = openpyxl.load_workbook(fpath)
-        export(tment, workbook, *io_params)
-        outfpath = os.path.join(os.path.dirname(fpath),
-                                tournament_name.lower().replace(' ', '_') + '_schedule{}.xlsx')
-        saved, attempts = False, 0
-        while not saved:
-            try:
-                final_fout = outfpath.format(' ({})'.format(attempts) if attempts else '')
-                workbook.save(final_fout)
-                saved = True
-            except PermissionError:
-                attempts += 1
-        print('Schedule saved: {}'.format(final_fout))
+            fpath = args.file
+
+        if os.path.splitext(fpath)[1].lower() in DATA_EXTENSIONS:
+            reexport_schedule(fpath, args.drop, args.add, args.save_data, args.in_place)
+        elif args.drop or args.add:
+            parser.error("--drop and --add change schedule data saved with --save-data; to "
+                         "reschedule from scratch, edit the roster in the workbook instead")
+        elif args.profile or args.trace:
+            with profiling.profile(args.trace, args.profile):
+                create_schedule(fpath, cache, args.invalidate_cache, args.save_data,
+                                args.optimize_tables, args.improve, args.workers)
+            for name, value in sorted(profiling.counters.items()):
+                print(f'{name}: {value}' + (f' ({profiling.timings[name]:.3f}s)'
+                                            if name in profiling.timings else ''))
+        else:
+            create_schedule(fpath, cache, args.invalidate_cache, args.save_data,
+                            args.optimize_tables, args.improve, args.workers)
 
     except (Exception, SystemExit) as excep:
         raise excep
         #print(excep)
 
     #this is expected to run in console windows which close very quickly on windows
-    if sys.platform in ["win32"]:
+    if sys.platform in ["win32"] and not args.headless:
         os.system("pause")
 
 if __name__ == "__main__":
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""A module containing ScheduleCache, an on-disk cache of finished schedules keyed by settings."""
+from datetime import date, time, timedelta
+import glob
+import hashlib
+import json
+import os
+import struct
+from scheduler.compact import CompactSchedule
+from scheduler.team import Team
+
+#everything Tournament.schedule() decides, besides the teams' events
+STATE_ATTRS = ('divs', 'j_duration', 'j_break', 'j_slots', 't_slots')
+_version = None
+
+def scheduler_version():
+    """Returns a digest of the scheduler's source, so that any change to it invalidates the cache."""
+    global _version
+    if _version is None:
+        digest = hashlib.sha256()
+        for fpath in sorted(glob.glob(os.path.join(os.path.dirname(__file__), '*.py'))):
+            with open(fpath, 'rb') as fin:
+                digest.update(os.path.basename(fpath).encode() + b'\0' + fin.read())
+        _version = digest.hexdigest()
+    return _version
+
+def _canonical(value):
+    """Converts the dates, times and durations in the settings to JSON-friendly values."""
+    if isinstance(value, timedelta):
+        return ['timedelta', value.total_seconds()]
+    if isinstance(value, (date, time)):
+        return [type(value).__name__, value.isoformat()]
+    raise TypeError(f"can't build a cache key from {value!r}")
+
+def settings_key(logic_params, **options):
+    """Returns the cache key for a tournament: a hash of its settings and the scheduler version.
+
+    logic_params -- the Tournament arguments returned by read_data
+    options -- any Tournament keyword arguments that change the schedule; those set to None are
+               left out, so they share the key of a tournament without them"""
+    options = {name: value for name, value in options.items() if value is not None}
+    settings = json.dumps([logic_params, options] if options else logic_params,
+                          default=_canonical, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256((scheduler_version() + settings).encode()).hexdigest()
+
+def restore_state(tment, state):
+    """Sets a freshly constructed Tournament to a state returned by CompactSchedule.state."""
+    for attr in STATE_ATTRS:
+        setattr(tment, attr, state[attr])
+    tment.teams = []
+    for num, name, div, events in state['teams']:
+        tment.teams.append(Team(num, name, div, journal=tment.journal))
+        tment.teams[-1].events = events
+
+class ScheduleCache:
+    """A directory of schedules in the CompactSchedule binary format, named by key and evicted
+    least-recently-used first.
+
+    Entries hold only packed integers and a JSON header, so reading one never runs code from the
+    directory; an entry that can't be read is removed and treated as missing. Reading an entry
+    refreshes its modification time, which serves as its last use; after each
+    write the oldest entries are deleted until the directory holds no more than max_bytes."""
+    def __init__(self, directory=None, max_bytes=64*2**20):
+        """Creates a cache in directory (default: the user's cache directory)."""
+        self.directory = directory or default_directory()
+        self.max_bytes = max_bytes
+
+    def path(self, key):
+        """Returns the file holding the entry for key."""
+        return os.path.join(self.directory, key + '.fllsched')
+
+    def get(self, key):
+        """Returns the CompactSchedule stored for key, or None if there is none (or it can't be
+        read)."""
+        try:
+            with open(self.path(key), 'rb') as fin:
+                sched = CompactSchedule.from_bytes(fin.read())
+            os.utime(self.path(key))
+            return sched
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, TypeError, struct.error):
+            self.invalidate(key)
+            return None
+
+    def put(self, key, sched):
+        """Stores a CompactSchedule for key, then evicts old entries if the cache has grown too
+        large."""
+        os.makedirs(self.directory, exist_ok=True)
+        temp_path = f'{self.path(key)}.{os.getpid()}.tmp'
+        with open(temp_path, 'wb') as fout:
+            fout.write(sched.to_bytes())
+        os.replace(temp_path, self.path(key))
+        self.evict()
+
+    def invalidate(self, key):
+        """Removes the entry for key; returns whether there was one."""
+        try:
+            os.remove(self.path(key))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def clear(self):
+        """Removes every entry."""
+        for fpath in glob.glob(self.path('*')):
+            with_missing_ok(os.remove, fpath)
+
+    def evict(self):
+        """Removes least-recently-used entries until the cache holds no more than max_bytes."""
+        entries = []
+        for fpath in glob.glob(self.path('*')):
+            stat = with_missing_ok(os.stat, fpath)
+            if stat is not None:
+                entries.append((stat.st_mtime, stat.st_size, fpath))
+        total = sum(size for _, size, _ in entries)
+        for _, size, fpath in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            with_missing_ok(os.remove, fpath)
+            total -= size
+
+def with_missing_ok(func, fpath):
+    """Returns func(fpath), or None if another process has already removed the file."""
+    try:
+        return func(fpath)
+    except FileNotFoundError:
+        return None
+
+def default_directory():
+    """Returns the per-user directory used for cached schedules."""
+    base = os.environ.get('LOCALAPPDATA') or os.environ.get('XDG_CACHE_HOME') or \
+           os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'fll-tournament-scheduler')
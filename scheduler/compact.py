@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""A module containing CompactSchedule, a columnar form of a finished schedule for saving to disk.
+
+Times are stored as integer seconds since datetime(1, 1, 1), the day every schedule is anchored
+to (minutes would lose the half-minute durations allowed by the input form), and teams, rooms,
+rounds and activities as small integers. None is stored as -1. Schedules can be written as JSON
+or as a binary file of packed arrays, and loading either needs nothing beyond the standard
+library; to_tournament rebuilds a Tournament that can be exported again without rescheduling."""
+from array import array
+from datetime import date, datetime, time, timedelta
+import json
+import struct
+import sys
+
+FORMAT_VERSION = 1
+MAGIC = b'FLLSCHED'
+EPOCH = datetime(1, 1, 1)
+SECOND = timedelta(seconds=1)
+
+#column name -> array typecode: 'h' for indices and ids, 'i' for seconds
+COLUMNS = {'event_team': 'h', 'event_activity': 'h', 'event_loc': 'h', 'event_start': 'i',
+           'event_duration': 'i', 'j_time': 'i', 'j_width': 'h', 'j_team': 'h',
+           't_start': 'i', 't_round': 'h', 't_team': 'h', 't_team_round': 'h'}
+
+def _encode(value):
+    """JSON hook tagging the datetimes, times and durations found in settings and team rows."""
+    if isinstance(value, timedelta):
+        return {'$timedelta': value // SECOND if not value % SECOND else value.total_seconds()}
+    if isinstance(value, (datetime, date, time)):
+        return {'$' + type(value).__name__: value.isoformat()}
+    raise TypeError(f"can't serialize {value!r}")
+
+def _decode(obj):
+    """JSON hook reversing _encode."""
+    if len(obj) == 1:
+        (key, value), = obj.items()
+        if key == '$timedelta':
+            return timedelta(seconds=value)
+        for kind in (datetime, date, time):
+            if key == '$' + kind.__name__:
+                return kind.fromisoformat(value)
+    return obj
+
+def _seconds(when):
+    """Returns a datetime as whole seconds since EPOCH."""
+    return (when - EPOCH) // SECOND
+
+def _index(value):
+    return -1 if value is None else value
+
+def _value(index):
+    return None if index == -1 else index
+
+class CompactSchedule:
+    """A finished schedule held as flat integer arrays plus a small JSON-compatible header.
+
+    meta holds the read_data results needed to rebuild and export the tournament (its settings,
+    name and io_params), the team roster in schedule order, and the scheduler-adjusted settings.
+    columns maps each name in COLUMNS to an array:
+    event_* -- one entry per team event: team index, activity id, location, start and duration
+    j_time, j_width -- per judging slot, its start and the teams per category (-1 for a break);
+                       j_team holds 3*j_width team indices for each slot in turn
+    t_start, t_round -- per table slot, its two start times and round (both -1 for a gap);
+                        t_team and t_team_round hold each table's team and that team's round,
+                        with -2 for a table left entirely unset"""
+    def __init__(self, meta, columns):
+        """Creates a schedule from its header and columns."""
+        self.meta = meta
+        self.columns = columns
+
+    @classmethod
+    def from_tournament(cls, tment, logic_params, tournament_name, io_params):
+        """Builds the compact form of a scheduled Tournament and the read_data results for it."""
+        columns = {name: array(code) for name, code in COLUMNS.items()}
+        team_idx = {id(team): i for i, team in enumerate(tment.teams)}
+        for i, team in enumerate(tment.teams):
+            for start, duration, activity, loc in team.events:
+                columns['event_team'].append(i)
+                columns['event_activity'].append(activity)
+                columns['event_loc'].append(loc)
+                columns['event_start'].append(_seconds(start))
+                columns['event_duration'].append(duration // SECOND)
+
+        for when, teams in tment.j_slots:
+            columns['j_time'].append(_seconds(when))
+            columns['j_width'].append(-1 if teams is None else len(teams[0]))
+            for cat in teams or ():
+                columns['j_team'].extend(_index(team) for team in cat)
+
+        for slot in tment.t_slots:
+            if slot is None:
+                columns['t_start'].extend((-1, -1))
+                columns['t_round'].append(-1)
+                continue
+            columns['t_start'].extend(_seconds(when) for when in slot[0])
+            columns['t_round'].append(_index(slot[1]))
+            for entry in slot[2]:
+                team, rnd = (-2, -2) if entry is None else map(_index, entry)
+                columns['t_team'].append(team)
+                columns['t_team_round'].append(rnd)
+
+        meta = {'format': FORMAT_VERSION, 'tournament_name': tournament_name,
+                'logic_params': logic_params, 'io_params': io_params,
+                'teams': [[team.num, team.name, team.div] for team in tment.teams],
+                'divs': [[rooms, [-1 if team is None else team if isinstance(team, int)
+                                  else team_idx[id(team)] for team in teams]]
+                         for rooms, teams in tment.divs],
+                'j_duration': tment.j_duration, 'j_break': tment.j_break,
+                'num_tables': 2*tment.t_pairs}
+        return cls(meta, columns)
+
+    def state(self):
+        """Returns the schedule as a scheduler.cache state (datetimes and team indices)."""
+        cols, num_tables = self.columns, self.meta['num_tables']
+        events = [[] for _ in self.meta['teams']]
+        for team, activity, loc, start, duration in zip(
+                cols['event_team'], cols['event_activity'], cols['event_loc'],
+                cols['event_start'], cols['event_duration']):
+            events[team].append([EPOCH + start*SECOND, duration*SECOND, activity, loc])
+
+        j_slots, pos = [], 0
+        for when, width in zip(cols['j_time'], cols['j_width']):
+            teams = None
+            if width != -1:
+                teams = [[_value(team) for team in cols['j_team'][pos + cat*width:
+                                                                  pos + (cat + 1)*width]]
+                         for cat in range(3)]
+                pos += 3*width
+            j_slots.append((EPOCH + when*SECOND, teams))
+
+        t_slots, pos = [], 0
+        for i, rnd in enumerate(cols['t_round']):
+            starts = cols['t_start'][2*i:2*i + 2]
+            if starts[0] == -1:
+                t_slots.append(None)
+                continue
+            teams = [None if team == -2 else (_value(team), _value(team_rnd)) for team, team_rnd
+                     in zip(cols['t_team'][pos:pos + num_tables],
+                            cols['t_team_round'][pos:pos + num_tables])]
+            pos += num_tables
+            t_slots.append([tuple(EPOCH + when*SECOND for when in starts), _value(rnd), teams])
+
+        return {'teams': [(num, name, div, team_events) for (num, name, div), team_events
+                          in zip(self.meta['teams'], events)],
+                'divs': [(rooms, [_value(team) for team in teams])
+                         for rooms, teams in self.meta['divs']],
+                'j_duration': tuple(self.meta['j_duration']),
+                'j_break': tuple(self.meta['j_break']), 'j_slots': j_slots, 't_slots': t_slots}
+
+    def to_tournament(self):
+        """Returns (tournament, tournament_name, io_params), ready to pass to schedule.export.
+
+        divs holds team indices rather than Team objects in the rebuilt tournament."""
+        from scheduler.cache import restore_state
+        from scheduler.tournament import Tournament
+        tment = Tournament(*self.meta['logic_params'])
+        restore_state(tment, self.state())
+        return tment, self.meta['tournament_name'], self.meta['io_params']
+
+    def to_json(self):
+        """Returns the schedule as a JSON document."""
+        return json.dumps({'meta': self.meta, 'columns': {name: col.tolist() for name, col
+                                                          in self.columns.items()}},
+                          default=_encode, separators=(',', ':'))
+
+    @classmethod
+    def from_json(cls, text):
+        """Reads a schedule written by to_json."""
+        data = json.loads(text, object_hook=_decode)
+        _check_version(data['meta'])
+        return cls(data['meta'], {name: array(code, data['columns'][name])
+                                  for name, code in COLUMNS.items()})
+
+    def to_bytes(self):
+        """Returns the schedule in the binary format: MAGIC, a length-prefixed JSON header, and
+        then each column's little-endian values in COLUMNS order."""
+        header = json.dumps({'meta': self.meta,
+                             'lengths': [len(self.columns[name]) for name in COLUMNS]},
+                            default=_encode, separators=(',', ':')).encode()
+        chunks = [MAGIC, struct.pack('<I', len(header)), header]
+        for name in COLUMNS:
+            col = array(COLUMNS[name], self.columns[name])
+            if sys.byteorder == 'big':
+                col.byteswap()
+            chunks.append(col.tobytes())
+        return b''.join(chunks)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Reads a schedule written by to_bytes."""
+        if data[:len(MAGIC)] != MAGIC:
+            raise ValueError("Not a compact schedule file")
+        pos = len(MAGIC) + 4
+        header_len, = struct.unpack_from('<I', data, len(MAGIC))
+        header = json.loads(data[pos:pos + header_len], object_hook=_decode)
+        _check_version(header['meta'])
+        pos += header_len
+        columns = {}
+        for (name, code), length in zip(COLUMNS.items(), header['lengths']):
+            col = array(code)
+            col.frombytes(data[pos:pos + length*col.itemsize])
+            if sys.byteorder == 'big':
+                col.byteswap()
+            columns[name] = col
+            pos += length*col.itemsize
+        return cls(header['meta'], columns)
+
+    def save(self, fpath):
+        """Writes the schedule as JSON if fpath ends in .json, and in binary otherwise."""
+        if fpath.lower().endswith('.json'):
+            with open(fpath, 'w') as fout:
+                fout.write(self.to_json())
+        else:
+            with open(fpath, 'wb') as fout:
+                fout.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, fpath):
+        """Reads a schedule written by save, in either format."""
+        with open(fpath, 'rb') as fin:
+            data = fin.read()
+        return cls.from_bytes(data) if data.startswith(MAGIC) else cls.from_json(data)
+
+def _check_version(meta):
+    """Raises ValueError if a schedule was written in a newer format than this module reads."""
+    if meta.get('format', 0) > FORMAT_VERSION:
+        raise ValueError("Schedule file format {} is newer than this scheduler supports"
+                         .format(meta['format']))
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""Contains improve_schedule, a local search over a finished tournament schedule.
+
+Each team's events are scored on their own (see team_score): broken travel and lunch rules are
+weighted so that any one outweighs every preference, then repeated tables and a short closest gap
+between events add smaller costs. A move swaps two teams' judging sessions within a room, swaps
+two teams between matches, or swaps the line-ups of two matches of the same length (moving a
+match into an idle one). Moves are made on the teams' calendars through the tournament's journal,
+so only the few teams involved are rescored and a move that raises the total is rolled back.
+Half of the moves involve a team breaking a rule, while there are any, and a team's seats are
+found from its own events, so each move costs the same however large the tournament. Given a time
+limit the search runs until it is reached; otherwise it only repairs broken rules, for at most
+REPAIR_MOVES moves and giving up once REPAIR_PASSES passes of one move per seat lower nothing, so
+its result depends only on the schedule and the seed."""
+import random
+import time
+import scheduler.profiling as profiling
+from scheduler.timeline import to_seconds
+import scheduler.util as util
+
+VIOLATION = 10**6 #per broken rule, plus a hundredth of this per minute it is broken by
+REPEAT = 10 #per table repeat, scaled as in TableCost
+GAP = 1 #per minute a team's closest events are less than twice the travel time apart
+REPAIR_MOVES = 20000 #the most moves a repair makes, however large the tournament
+REPAIR_PASSES = 20 #passes of one move per seat without an improvement before a repair gives up
+
+def team_score(tment, team):
+    """Returns the penalty of one team's events; lower is better."""
+    timeline, travel = team.timeline, to_seconds(tment.travel)
+    score, closest = 0, None
+    for i in range(len(timeline) - 1):
+        gap = timeline.starts[i + 1] - timeline.reach[i]
+        closest = gap if closest is None else min(closest, gap)
+        if gap < travel:
+            score += VIOLATION*(1 + (travel - gap) / 6000)
+    if closest is not None:
+        score += GAP*max(0, 2*travel - closest) / 60
+
+    earliest, latest, length = map(to_seconds, tment.lunch)
+    lunch = team.next_avail_secs(earliest, length)
+    if lunch is None: #no gap of the lunch length anywhere
+        score += VIOLATION*2
+    elif lunch > latest:
+        score += VIOLATION*(1 + (lunch - latest) / 6000)
+
+    tables = {}
+    for event in team.events:
+        if event[2] > 4:
+            tables[event[3]] = tables.get(event[3], 0) + 1
+    return score + REPEAT*sum(k ** 1.1 for count in tables.values() for k in range(count))
+
+def violations(scores):
+    """Returns how many of the scored teams break a travel or lunch rule."""
+    return sum(score >= VIOLATION for score in scores)
+
+def improve_schedule(tment, time_limit=None, seed=0):
+    """Improves a scheduled tournament in place by local search.
+
+    time_limit -- seconds to search for (default None: only until no team breaks a rule, for at
+                  most REPAIR_MOVES moves or until REPAIR_PASSES passes of one move per seat
+                  bring no improvement)
+    seed -- seeds the choice of moves, so a search that ends early is repeatable (default 0)
+    Returns the total score before and after."""
+    search = _Search(tment, random.Random(seed))
+    before = best = search.total
+    repair_only = time_limit is None
+    deadline = None if repair_only else time.perf_counter() + time_limit
+    patience = REPAIR_PASSES*(len(search.judge_seats) + len(search.table_seats))
+    moves = [move for move, seats in ((search.swap_judging, search.judge_seats),
+                                      (search.swap_teams, search.table_seats),
+                                      (search.swap_matches, search.matches)) if len(seats) > 1]
+    tried = accepted = stalled = 0
+    while moves and (stalled < patience and tried < REPAIR_MOVES if repair_only
+                     else time.perf_counter() < deadline):
+        broken = sorted(search.broken)
+        if repair_only and not broken:
+            break
+        focus = search.rng.choice(broken) if broken and search.rng.random() < 0.5 else None
+        tried += 1
+        accepted += search.attempt(search.rng.choice(moves)(focus))
+        if search.total < best - 1e-6: #ignoring rounding from rescoring a reordered total
+            best, stalled = search.total, 0
+        else:
+            stalled += 1
+
+    if profiling.enabled:
+        profiling.count('improve moves tried', tried)
+        profiling.count('improve moves accepted', accepted)
+    return before, search.total
+
+class _Search:
+    """The seats of a scheduled tournament and the team scores that moves between them change.
+
+    A judging seat is (j_slots index, category, room) and a table seat is (t_slots index, table)."""
+    def __init__(self, tment, rng):
+        self.tment, self.rng = tment, rng
+        self.scores = [team_score(tment, team) for team in tment.teams]
+        self.total = sum(self.scores)
+        self.broken = {team for team, score in enumerate(self.scores) if score >= VIOLATION}
+        self.judge_seats = [(k, cat, room) for k, (_, teams) in enumerate(tment.j_slots)
+                            if teams is not None and len(teams[0]) == tment.j_sets
+                            for cat in range(3) for room in range(tment.j_sets)]
+        self.matches = [k for k, slot in enumerate(tment.t_slots)
+                        if slot is not None and slot[1] is not None] #idle slots have no length
+        self.table_seats = [(k, table) for k in self.matches
+                            for table in range(len(tment.t_slots[k][2]))
+                            if tment.t_slots[k][2][table][0] is not None]
+        #(start, activity, room or table) -> seat, with every table round as activity 5
+        self.seat_at = {(tment.j_slots[k][0], cat + 2, room): (k, cat, room)
+                        for k, cat, room in self.judge_seats}
+        self.seat_at.update(((self.event((k, table))[0], 5, table), (k, table))
+                            for k in self.matches for table in range(len(tment.t_slots[k][2])))
+
+    def pick(self, seats, focus):
+        """Returns a random seat, held by team focus unless that is None (or it holds none)."""
+        held = [seat for seat in self.seats_of(focus) if len(seat) == len(seats[0])] \
+               if focus is not None else []
+        return self.rng.choice(held or seats)
+
+    def swap_judging(self, focus=None):
+        """Returns a move swapping two judging seats of one room and category."""
+        k, cat, room = self.pick(self.judge_seats, focus)
+        other = self.rng.choice(self.judge_seats)[0]
+        return [((k, cat, room), (other, cat, room))]
+
+    def swap_teams(self, focus=None):
+        """Returns a move swapping the teams in two table seats (if both still hold teams)."""
+        seats = (self.pick(self.table_seats, focus), self.rng.choice(self.table_seats))
+        return [seats] if None not in map(self.team_at, seats) else []
+
+    def swap_matches(self, focus=None):
+        """Returns a move swapping the line-ups of two matches of the same length."""
+        first = self.pick(self.table_seats, focus)[0]
+        second = self.rng.choice(self.matches)
+        slots, durations = self.tment.t_slots, self.tment.t_duration
+        if durations[slots[first][1]] != durations[slots[second][1]] or \
+                len(slots[first][2]) != len(slots[second][2]):
+            return []
+        return [((first, table), (second, table)) for table in range(len(slots[first][2]))]
+
+    def attempt(self, swaps):
+        """Makes the swaps of seat pairs, keeping them unless they raise the total score.
+
+        Returns whether they were kept."""
+        tment = self.tment
+        changes = [(seat, self.team_at(other)) for pair in swaps
+                   for seat, other in (pair, pair[::-1])]
+        teams = {team for _, team in changes} - {None}
+        if not teams:
+            return False
+        mark, undo = tment.snapshot(), []
+        for seat, team in changes:
+            self.move(seat, team, undo)
+        if len(changes[0][0]) == 2:
+            for team in teams:
+                self.renumber_rounds(team, undo)
+        new_scores = {team: team_score(tment, tment.teams[team]) for team in teams}
+        change = sum(new_scores.values()) - sum(self.scores[team] for team in teams)
+        if change <= 0:
+            self.total += change
+            for team, score in new_scores.items():
+                self.scores[team] = score
+                if score >= VIOLATION:
+                    self.broken.add(team)
+                else:
+                    self.broken.discard(team)
+            del tment.journal[mark:]
+            return True
+        tment.rollback(mark)
+        for restore in reversed(undo):
+            restore()
+        return False
+
+    def team_at(self, seat):
+        """Returns the index of the team in a seat, or None."""
+        if len(seat) == 3:
+            return self.tment.j_slots[seat[0]][1][seat[1]][seat[2]]
+        return self.tment.t_slots[seat[0]][2][seat[1]][0]
+
+    def event(self, seat, team_rnd=0):
+        """Returns the event (without team) of sitting in a seat."""
+        tment = self.tment
+        if len(seat) == 3:
+            k, cat, room = seat
+            return tment.j_slots[k][0], tment.j_duration[1], cat + 2, room
+        k, table = seat
+        times, rnd, _ = tment.t_slots[k]
+        return (times[table >= util.round_to(tment.t_pairs, 2) and tment.t_stagger],
+                tment.t_duration[rnd], 5 + team_rnd, table)
+
+    def move(self, seat, team, undo):
+        """Seats a team (or None) in a seat, moving the events of both it and the one leaving."""
+        tment = self.tment
+        leaving = self.team_at(seat)
+        if len(seat) == 3: #judging rooms may be tuples, so the slot's entry is rebuilt
+            k, cat, room = seat
+            slots, idx, old = tment.j_slots, k, tment.j_slots[k]
+            rooms = list(old[1][cat])
+            rooms[room] = team
+            cats = list(old[1])
+            cats[cat] = type(old[1][cat])(rooms)
+            new = (old[0], type(old[1])(cats))
+        else:
+            k, table = seat
+            slots, idx, old = tment.t_slots[k][2], table, tment.t_slots[k][2][table]
+            new = (team, None if team is None else 0)
+        if leaving is not None:
+            tment.teams[leaving].remove_event(*self.event(seat, old[1] if len(seat) == 2 else 0))
+        if team is not None:
+            tment.teams[team].add_event(*self.event(seat))
+        slots[idx] = new
+        undo.append(lambda: slots.__setitem__(idx, old))
+
+    def renumber_rounds(self, team, undo):
+        """Numbers a team's table events (and t_slots entries) in order of time."""
+        tment = self.tment
+        seats = sorted((self.event(seat)[0], seat) for seat in self.seats_of(team)
+                       if len(seat) == 2)
+        for team_rnd, (_, (k, table)) in enumerate(seats):
+            entries = tment.t_slots[k][2]
+            old = entries[table]
+            if old[1] != team_rnd:
+                tment.teams[team].remove_event(*self.event((k, table), old[1]))
+                tment.teams[team].add_event(*self.event((k, table), team_rnd))
+                entries[table] = (team, team_rnd)
+                undo.append(lambda entries=entries, table=table, old=old:
+                            entries.__setitem__(table, old))
+
+    def seats_of(self, team):
+        """Returns the judging and table seats a team holds, found from its events."""
+        seats = []
+        for start, _, activity, loc in self.tment.teams[team].events:
+            seat = self.seat_at.get((start, min(activity, 5), loc))
+            if seat is not None and self.team_at(seat) == team:
+                seats.append(seat)
+        return seats
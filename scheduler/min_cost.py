@@ -1,30 +1,147 @@
 #!/usr/bin/env python3
 """Contains min_cost, which returns a minimum-cost ordering of input values."""
-def min_cost(teams, cost):
+import math
+import scheduler.profiling as profiling
+
+def min_cost(teams, cost, assignment_bound=None):
     """Returns a minimum-cost ordering of teams to slots with no more than one unpaired team.
 
     teams -- a list of teams to order; None indicates an empty slot
-    cost -- the cost function used evaluate orderings; takes a list and return a number or tuple"""
+    cost -- the cost function used evaluate orderings; takes a list and returns a number, and must
+            be a sum of per-(team, slot) costs plus a fixed penalty for each pair with one team.
+            A cost model providing table_costs and lone_cost (see TableCost) is used directly
+    assignment_bound -- bound the search with an optimal assignment of the remaining teams
+                        (default: only when ordering more than 8 slots)"""
     if len(teams) % 2: #this is designed for table pairs; that means even
         raise ValueError("Team list must contain an even number of elements")
-    init_best = (cost(teams), teams)
-    nones = sum(1 for team in teams if team is None)
-    teams = [team for team in teams if team is not None]
-    return _min_cost_internal(teams, cost, nones, [], init_best)[1]
-
-def _min_cost_internal(teams, cost, nones, start_teams, best):
-    """Basic branch-and-bound assignment sum solver; constructs orders to minimize lone teams."""
-    start_cost = cost(start_teams)
-    if not teams and start_cost < best[0]:
-        best = (start_cost, start_teams + nones*[None])
-    elif best[0] > start_cost and best[0] > cost([]):
-        orders = []
-        one_none = nones and not (len(start_teams) % 2 and start_teams[-1] is None)
-        two_none = nones > 1 and len(start_teams) % 2 == 0
-        for nones_used in [0] + one_none*[1] + two_none*[2]:
-            orders += [([t for t in teams if t != team], nones - nones_used,
-                        start_teams + nones_used*[None] + [team]) for team in teams]
-        for new_teams, new_nones, new_start in sorted(orders, key=lambda order: cost(order[0])):
-            best = min(best, _min_cost_internal(new_teams, cost, new_nones, new_start, best),
-                       key=lambda x: x[0])
-    return best
+    placed = [team for team in teams if team is not None]
+    if not placed:
+        return teams
+    if assignment_bound is None:
+        assignment_bound = len(teams) > 8
+
+    if hasattr(cost, 'table_costs'):
+        table_costs, lone_cost = cost.table_costs(placed, len(teams)), cost.lone_cost
+    else:
+        table_costs, lone_cost = _cost_matrix(placed, len(teams), cost)
+
+    idx = {team: i for i, team in enumerate(placed)}
+    init_cost = sum(table_costs[idx[team]][slot] for slot, team in enumerate(teams)
+                    if team is not None)
+    init_cost += lone_cost*sum((teams[i] is None) != (teams[i + 1] is None)
+                               for i in range(0, len(teams), 2))
+
+    order = _min_cost_internal(table_costs, lone_cost, len(teams), init_cost, assignment_bound)
+    return teams if order is None else [None if i is None else placed[i] for i in order]
+
+def _cost_matrix(teams, slots, cost):
+    """Splits a separable cost function into a team-by-slot cost matrix and a lone-team penalty."""
+    empty = slots*[None]
+    base = cost(empty)
+    def placed(team, *positions):
+        order = list(empty)
+        for pos in positions:
+            order[pos] = team
+        return cost(order) - base
+
+    lone_cost = (placed(teams[0], 0) + placed(teams[0], 1) - placed(teams[0], 0, 1)) / 2
+    return [[placed(team, slot) - lone_cost for slot in range(slots)] for team in teams], lone_cost
+
+def _min_cost_internal(table_costs, lone_cost, slots, incumbent, assignment_bound):
+    """Memoized branch-and-bound solver; fills slots in order, pruning against a shared incumbent.
+
+    Returns the cheapest ordering of team indices (None for empty slots) costing strictly less than
+    the incumbent, or None if no such ordering exists. Subproblems are keyed by the bitmask of
+    teams still to be placed, the next slot, and whether the open pair holds a team or a None."""
+    num_teams = len(table_costs)
+    suffix_min = [[min(row[slot:]) for slot in range(slots)] + [0] for row in table_costs]
+    memo, assignments = {}, {}
+    expanded = 0
+
+    def lower_bound(slot, remaining, open_pair):
+        teams_left = [i for i in range(num_teams) if remaining >> i & 1]
+        lone = (len(teams_left) + (open_pair == 1)) % 2 * lone_cost
+        if not teams_left:
+            return lone
+        if assignment_bound and len(teams_left) > 1:
+            if (remaining, slot) not in assignments:
+                assignments[remaining, slot] = _assignment_cost([table_costs[i][slot:]
+                                                                 for i in teams_left])
+            return assignments[remaining, slot] + lone
+        return sum(suffix_min[i][slot] for i in teams_left) + lone
+
+    def search(slot, remaining, open_pair, budget):
+        """Returns (cost, order) of the best completion under budget, or (lower bound, None)."""
+        nonlocal expanded
+        if slot == slots:
+            return (0, []) if budget > 0 else (0, None)
+        key = (remaining, slot, open_pair)
+        if key in memo:
+            known, order = memo[key]
+            if order is not None or known >= budget:
+                return (known, order) if known < budget else (known, None)
+        bound = lower_bound(slot, remaining, open_pair)
+        if bound >= budget:
+            memo[key] = (bound, None)
+            return bound, None
+        expanded += 1
+
+        candidates = []
+        pair_end = slot % 2
+        if remaining:
+            candidates += [(table_costs[i][slot] + (pair_end and open_pair == 2)*lone_cost, i)
+                           for i in range(num_teams) if remaining >> i & 1]
+        if slots - slot > bin(remaining).count('1'):
+            candidates.append(((pair_end and open_pair == 1)*lone_cost, num_teams))
+
+        best, best_order = budget, None
+        for step, i in sorted(candidates):
+            if step >= best:
+                break
+            is_none = i == num_teams
+            child = (slot + 1, remaining & ~(1 << i) if not is_none else remaining,
+                     0 if pair_end else 1 + is_none)
+            sub_cost, sub_order = search(*child, best - step)
+            if sub_order is not None:
+                best, best_order = step + sub_cost, [None if is_none else i] + sub_order
+        memo[key] = (best, best_order)
+        return best, best_order
+
+    order = search(0, (1 << num_teams) - 1, 0, incumbent)[1]
+    if profiling.enabled:
+        profiling.count('min_cost calls')
+        profiling.count('min_cost nodes expanded', expanded)
+    return order
+
+def _assignment_cost(costs):
+    """Returns the minimum cost of assigning each row to a distinct column (Hungarian algorithm).
+
+    costs -- a matrix (list of rows) with no more rows than columns"""
+    rows, cols = len(costs), len(costs[0])
+    row_pot, col_pot = (rows + 1)*[0], (cols + 1)*[0]
+    match, way = (cols + 1)*[0], (cols + 1)*[0]
+    for row in range(1, rows + 1):
+        match[0], col = row, 0
+        min_slack, used = (cols + 1)*[math.inf], (cols + 1)*[False]
+        while match[col]:
+            used[col] = True
+            cur_row, delta, next_col = match[col], math.inf, 0
+            for j in range(1, cols + 1):
+                if not used[j]:
+                    slack = costs[cur_row - 1][j - 1] - row_pot[cur_row] - col_pot[j]
+                    if slack < min_slack[j]:
+                        min_slack[j], way[j] = slack, col
+                    if min_slack[j] < delta:
+                        delta, next_col = min_slack[j], j
+            for j in range(cols + 1):
+                if used[j]:
+                    row_pot[match[j]] += delta
+                    col_pot[j] -= delta
+                else:
+                    min_slack[j] -= delta
+            col = next_col
+        while col:
+            prev = way[col]
+            match[col] = match[prev]
+            col = prev
+    return -col_pot[0]
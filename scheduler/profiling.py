@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""Opt-in counters, timings and profile output for the scheduler's hot paths.
+
+Instrumented code checks profiling.enabled before recording anything, so while it is disabled
+(the default) each instrumented call costs one attribute lookup."""
+import cProfile
+import functools
+import json
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+enabled = False
+counters = Counter()
+timings = defaultdict(float)
+trace_events = []
+_start = time.perf_counter()
+
+def count(name, amount=1):
+    """Adds amount to the named counter."""
+    counters[name] += amount
+
+def timed(func):
+    """Decorates a function so that, while enabled, each call's duration is recorded."""
+    name = func.__qualname__
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not enabled:
+            return func(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            end = time.perf_counter()
+            counters[name] += 1
+            timings[name] += end - start
+            trace_events.append({'name': name, 'ph': 'X', 'ts': (start - _start)*1e6,
+                                 'dur': (end - start)*1e6, 'pid': os.getpid(),
+                                 'tid': threading.get_ident()})
+    return wrapper
+
+def reset():
+    """Clears every recorded counter, timing and trace event."""
+    counters.clear()
+    timings.clear()
+    trace_events.clear()
+
+def report():
+    """Returns the recorded counters and total timings (in seconds) as a dict."""
+    return {'counters': dict(counters), 'timings': {name: round(secs, 6)
+                                                    for name, secs in timings.items()}}
+
+def write_trace(fpath):
+    """Writes the recorded calls and final counter values as Chrome trace-event JSON."""
+    end = (time.perf_counter() - _start)*1e6
+    events = trace_events + [{'name': name, 'ph': 'C', 'ts': end, 'pid': os.getpid(),
+                              'args': {'value': value}} for name, value in counters.items()]
+    with open(fpath, 'w') as fout:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, fout)
+
+@contextmanager
+def profile(trace_path=None, pstats_path=None):
+    """Enables instrumentation for the duration of the block, then writes the requested outputs.
+
+    trace_path -- where to write a Chrome trace-event JSON file (default None)
+    pstats_path -- where to write a cProfile dump readable with pstats (default None)"""
+    global enabled
+    reset()
+    profiler = cProfile.Profile() if pstats_path else None
+    enabled = True
+    if profiler:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(pstats_path)
+        enabled = False
+        if trace_path:
+            write_trace(trace_path)
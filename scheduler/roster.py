@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""Contains update_roster, which adds and drops teams in a finished schedule without rescheduling.
+
+Dropped teams leave their judging and table seats empty. Each added team gets the coaches' meeting
+and opening ceremonies, then the earliest empty seat in each judging category (in its division's
+rooms first) and in each table round (beside a team left without an opponent first) that it can
+reach with travel time to spare and that still leaves it a lunch break. Only when no empty seat
+works is a judging session or match added at the end of the day. Every other team's events are
+left as they were."""
+import scheduler.util as util
+from scheduler.team import Team
+
+def update_roster(tment, drop=(), add=()):
+    """Drops and adds teams in a scheduled tournament in place.
+
+    drop -- the numbers of the teams to remove
+    add -- a (number, name[, division]) row for each team to add, as in the input roster
+    Returns the teams whose events changed, which are the added ones."""
+    nums = {team.num for team in tment.teams}
+    if not set(drop) <= nums:
+        raise ValueError("No team numbered {} in the schedule".format(
+            ', '.join(map(str, sorted(set(drop) - nums)))))
+    nums -= set(drop)
+    for row in add:
+        if int(row[0]) in nums:
+            raise ValueError("Team {} is already in the schedule".format(row[0]))
+        nums.add(int(row[0]))
+
+    drop_teams(tment, set(drop))
+    moved = []
+    for row in add:
+        tment.teams.append(Team(*row, journal=tment.journal))
+        tment.num_teams += 1
+        _add_to_divs(tment, tment.num_teams - 1)
+        place_team(tment, tment.num_teams - 1)
+        moved.append(tment.teams[-1])
+    return moved
+
+def drop_teams(tment, drop):
+    """Removes the teams numbered in drop, emptying their seats and renumbering the rest."""
+    index = {}
+    for i, team in enumerate(tment.teams):
+        if team.num not in drop:
+            index[i] = len(index)
+    def kept(team): #divs hold Team objects, or indices in a tournament rebuilt from saved data
+        if isinstance(team, int):
+            return index.get(team)
+        return None if team is None or team.num in drop else team
+    tment.teams = [team for i, team in enumerate(tment.teams) if i in index]
+    tment.num_teams = len(tment.teams)
+
+    tment.j_slots = [(time, None if teams is None else
+                      [[index.get(team) for team in cat] for cat in teams])
+                     for time, teams in tment.j_slots]
+    for slot in filter(None, tment.t_slots):
+        slot[2][:] = [(None, None) if entry is None or entry[0] not in index else
+                      (index[entry[0]], entry[1]) for entry in slot[2]]
+    tment.divs = [(rooms, list(map(kept, teams))) for rooms, teams in tment.divs]
+
+def _add_to_divs(tment, idx):
+    """Adds the team at index idx to the judging group of its division in tment.divs, if any."""
+    team = tment.teams[idx]
+    for rooms, teams in tment.divs:
+        members = [tment.teams[t] if isinstance(t, int) else t for t in teams if t is not None]
+        if not tment.divisions or any(member.div == team.div for member in members):
+            entry = idx if any(isinstance(t, int) for t in teams) else team
+            if None in teams:
+                teams[teams.index(None)] = entry
+            else:
+                teams.append(entry)
+            return
+
+def place_team(tment, idx):
+    """Gives the team at index idx its opening events, a judging session in every category and a
+    match in every round, all in seats no other team holds."""
+    team = tment.teams[idx]
+    team.add_event(*tment.coach_meet, 0, 0)
+    team.add_event(*tment.opening, 1, 0)
+    home = judge_rooms(tment, team.div) if tment.divisions else set()
+    for cat in range(3):
+        seats = sorted((room not in home, time, k, room)
+                       for k, (time, teams) in enumerate(tment.j_slots)
+                       if teams is not None and len(teams[cat]) == tment.j_sets
+                       for room in range(tment.j_sets) if teams[cat][room] is None)
+        seat = next((seat[2:] for seat in seats if _fits(tment, team, seat[1],
+                                                         tment.j_duration[1], cat + 2, seat[3])),
+                    None)
+        if seat is None:
+            seat = (_new_judging(tment, team), min(home or {0}))
+        k, room = seat
+        time, teams = tment.j_slots[k]
+        teams = [list(row) for row in teams]
+        teams[cat][room] = idx
+        tment.j_slots[k] = (time, teams)
+        team.add_event(time, tment.j_duration[1], cat + 2, room)
+
+    after = tment.opening[0]
+    for rnd in range(tment.t_rounds):
+        duration = tment.t_duration[rnd]
+        seats = sorted((slot[1] != rnd, not _has_opponent(slot, table), start, k, table)
+                       for k, slot in enumerate(tment.t_slots)
+                       if slot is not None and slot[1] is not None
+                       and tment.t_duration[slot[1]] == duration
+                       for table in range(len(slot[2]))
+                       for start in [table_start(tment, slot, table)]
+                       if start > after and slot[2][table] in (None, (None, None)))
+        seat = next((seat[3:] for seat in seats if _fits(tment, team, seat[2], duration,
+                                                         5 + rnd, seat[4])), None)
+        if seat is None:
+            seat = (_new_match(tment, team, rnd), 0)
+        k, table = seat
+        tment.t_slots[k][2][table] = (idx, rnd)
+        after = table_start(tment, tment.t_slots[k], table)
+        team.add_event(after, duration, 5 + rnd, table)
+
+def judge_rooms(tment, div):
+    """Returns the judging rooms that see teams of division div."""
+    return {room for _, teams in tment.j_slots if teams is not None and
+            len(teams[0]) == tment.j_sets for cat in teams
+            for room, team in enumerate(cat) if team is not None and tment.teams[team].div == div}
+
+def table_start(tment, slot, table):
+    """Returns when a table starts its part of a match (later for staggered tables)."""
+    return slot[0][table >= util.round_to(tment.t_pairs, 2) and tment.t_stagger]
+
+def _has_opponent(slot, table):
+    """Returns whether the table opposite this one in a match holds a team."""
+    opposite = slot[2][table ^ 1] if table ^ 1 < len(slot[2]) else None
+    return opposite is not None and opposite[0] is not None
+
+def _fits(tment, team, start, duration, activity, loc):
+    """Returns whether the team can take an event with travel time around it and still have lunch."""
+    if not team.available(start, duration, tment.travel):
+        return False
+    mark = tment.snapshot()
+    team.add_event(start, duration, activity, loc)
+    lunch = team.next_avail(tment.lunch[0], tment.lunch[2])
+    tment.rollback(mark)
+    return lunch is not None and lunch <= tment.lunch[1]
+
+def _new_judging(tment, team):
+    """Adds an empty judging session after the last that the team can attend; returns its index."""
+    time = max(when for when, _ in tment.j_slots) + tment.j_duration[0]
+    while not team.available(time, tment.j_duration[1], tment.travel):
+        time += tment.j_duration[0]
+    tment.j_slots.append((time, [tment.j_sets*[None] for _ in range(3)]))
+    return len(tment.j_slots) - 1
+
+def _new_match(tment, team, rnd):
+    """Adds an empty match of round rnd after the last that the team can play; returns its index."""
+    duration = tment.t_duration[rnd]
+    slots = [slot for slot in tment.t_slots if slot is not None and slot[1] is not None]
+    time = max(slot[0][0] + tment.t_duration[slot[1]] for slot in slots) if slots else \
+           tment.opening[0] + tment.opening[1] + tment.travel
+    time = team.next_avail(time, duration, tment.travel)
+    if time is None:
+        raise ValueError(f"{team} has no time left for another match")
+    tment.t_slots.append([(time, time + duration / 2), rnd, 2*tment.t_pairs*[(None, None)]])
+    return len(tment.t_slots) - 1
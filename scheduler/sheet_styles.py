@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""A module containing the shared cell styles, width tracking and copied input formatting used to
+export schedules."""
+class StyleRegistry:
+    """Interns every cell style the exported sheets use as a NamedStyle of one workbook.
+
+    Styles are keyed by (bold, shaded, border), where border is None or a (side, weight) pair
+    such as ('left', 'thick'); all of them are centered. Styles copied from an input sheet (see
+    sheet_format) are keyed by their description. Each is built and registered once, and cells are
+    given it by name."""
+    def __init__(self, workbook):
+        """Creates an empty registry for the given workbook."""
+        from openpyxl.cell import WriteOnlyCell #openpyxl is only loaded once exporting starts
+        self.workbook = workbook
+        self.names = {}
+        self.new_cell = WriteOnlyCell
+
+    def cell(self, sheet, value, bold=False, shaded=False, border=None):
+        """Returns a write-only cell holding value in the given style."""
+        cell = self.new_cell(sheet, value)
+        cell.style = self._name(bold, shaded, border)
+        return cell
+
+    def copied_cell(self, sheet, value, style):
+        """Returns a write-only cell holding value in a style described by sheet_format."""
+        key = tuple(style)
+        if key not in self.names:
+            import openpyxl.styles as styles
+            from openpyxl.styles.fills import Fill
+            from openpyxl.xml.functions import fromstring
+            font, fill, border, alignment, protection, number_format = key
+            name = 'Copied {}'.format(len(self.names))
+            self.workbook.add_named_style(styles.NamedStyle(
+                name, font=styles.Font.from_tree(fromstring(font)),
+                fill=Fill.from_tree(fromstring(fill)),
+                border=styles.Border.from_tree(fromstring(border)),
+                alignment=styles.Alignment.from_tree(fromstring(alignment)),
+                protection=styles.Protection.from_tree(fromstring(protection)),
+                number_format=number_format))
+            self.names[key] = name
+        cell = self.new_cell(sheet, value)
+        cell.style = self.names[key]
+        return cell
+
+    def _name(self, bold, shaded, border):
+        """Returns the name of a style, building and registering it on first use."""
+        key = (bold, shaded, border)
+        if key not in self.names:
+            import openpyxl.styles as styles
+            name = ' '.join(['Schedule'] + bold*['Header'] + shaded*['Shaded'] + list(border or ()))
+            style = styles.NamedStyle(name, alignment=styles.Alignment(horizontal='center'))
+            if bold:
+                style.font = styles.Font(bold=True)
+            if shaded:
+                style.fill = styles.PatternFill('solid', fgColor='DDDDDD')
+            if border:
+                style.border = styles.Border(**{border[0]: styles.Side(border_style=border[1],
+                                                                       color='000000')})
+            self.workbook.add_named_style(style)
+            self.names[key] = name
+        return self.names[key]
+
+def sheet_format(sheet, rows):
+    """Returns the look of a read-only input sheet, given its rows of cells, for copying into an
+    export: a dict of its 'columns' as [first, last, width, hidden] and of each distinct cell
+    'styles' and the index of each cell's style (or None if it has none) by row in 'cells'.
+
+    A style is the XML of its font, fill, border, alignment and protection and its number format,
+    so the whole can be saved as JSON with schedule data. Widths are read from the sheet's XML,
+    which read-only sheets don't parse."""
+    from xml.etree.ElementTree import iterparse
+    from openpyxl.xml.functions import tostring
+    columns = []
+    with sheet._get_source() as source:
+        for _, element in iterparse(source, events=('start',)): #cols come before the cells
+            if element.tag.endswith('}col'):
+                columns.append([int(element.get('min')), int(element.get('max')),
+                                float(element.get('width', 0)) or None,
+                                element.get('hidden') in ('1', 'true')])
+            elif element.tag.endswith('}sheetData'):
+                break
+
+    styles, index, cells = [], {}, []
+    for row in rows:
+        cells.append([])
+        for cell in row:
+            if not getattr(cell, 'has_style', False): #empty cells have no style at all
+                cells[-1].append(None)
+                continue
+            if cell.style_array not in index:
+                index[cell.style_array] = len(styles)
+                styles.append([tostring(part.to_tree()).decode() for part in
+                               (cell.font, cell.fill, cell.border, cell.alignment, cell.protection)]
+                              + [cell.number_format])
+            cells[-1].append(index[cell.style_array])
+    return {'columns': columns, 'styles': styles, 'cells': cells}
+
+class SheetRows(list):
+    """The rows of a sheet being generated, tracking the column widths needed to fit them.
+
+    Widths are 2 more than the longest value in each column (ignoring formulas) from row
+    width_from onwards, with a minimum of 2."""
+    def __init__(self, rows=(), width_from=0):
+        """Creates the rows, starting width tracking at row index width_from (default 0)."""
+        super().__init__()
+        self.width_from = width_from
+        self.widths = []
+        for row in rows:
+            self.append(row)
+
+    def append(self, row):
+        """Adds a row, widening any columns it doesn't fit in."""
+        row = list(row)
+        widths = self.widths
+        if len(row) > len(widths):
+            widths += (len(row) - len(widths))*[2]
+        if len(self) >= self.width_from:
+            for col, value in enumerate(row):
+                if value and (not isinstance(value, str) or value[0] != '='):
+                    widths[col] = max(widths[col], 2 + len(str(value)))
+        super().append(row)
+
+    def extend(self, rows):
+        """Adds each of the rows in turn."""
+        for row in rows:
+            self.append(row)
+
+    def __iadd__(self, rows):
+        self.extend(rows)
+        return self
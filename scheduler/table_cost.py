@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""A module containing TableCost, the table-repetition cost model used when assigning tables."""
+import numpy
+
+class TableCost:
+    """Scores orderings of teams across tables by how often each team has played at each table.
+
+    Keeps a (teams, tables) matrix of match counts alongside a cached copy raised to the
+    repetition exponent, so scoring never recomputes powers. Orderings are lists of team indices
+    in table order, with None for an empty table; each table pair holding exactly one team costs
+    a fixed lone-team penalty."""
+    def __init__(self, num_teams, num_tables, lone_cost, exponent=1.1):
+        """Creates an empty cost model.
+
+        num_teams -- the number of teams in the tournament
+        num_tables -- the number of tables (twice the number of table pairs)
+        lone_cost -- the penalty for each table pair with exactly one team
+        exponent -- the power applied to repeat counts (default 1.1)"""
+        self.counts = numpy.zeros((num_teams, num_tables), dtype=int)
+        self.powered = numpy.zeros((num_teams, num_tables))
+        self.lone_cost = lone_cost
+        self.exponent = exponent
+
+    def __call__(self, order):
+        """Returns the cost of a (possibly partial) ordering."""
+        return float(sum(self.powered[team, table] for table, team in enumerate(order)
+                         if team is not None)) + self.lone_cost*self.lone_pairs(order)
+
+    def add(self, order, count=1):
+        """Records (or with count=-1, forgets) that an ordering was played; O(1) per team.
+
+        Returns the change this makes to the total of everything recorded (see total), so a
+        search can keep its cost up to date without rescoring the whole assignment."""
+        change = count*self.lone_cost*self.lone_pairs(order)
+        for table, team in enumerate(order):
+            if team is not None:
+                if count > 0: #the match added is the team's nth at the table: (n - 1)**exponent
+                    change += self.powered[team, table]
+                self.counts[team, table] += count
+                self.powered[team, table] = self.counts[team, table] ** self.exponent
+                if count < 0:
+                    change -= self.powered[team, table]
+        return float(change)
+
+    def remove(self, order):
+        """Forgets that an ordering was played; returns the change in the total, as add does."""
+        return self.add(order, -1)
+
+    @staticmethod
+    def lone_pairs(order):
+        """Returns how many table pairs of an ordering hold exactly one team."""
+        return sum((order[i] is None) != (order[i + 1] is None)
+                   for i in range(0, len(order) - 1, 2))
+
+    def total(self, orders):
+        """Returns the cost of a whole assignment, whose orderings have all been added.
+
+        A team's nth match at the same table costs (n - 1)**exponent, as in the powered counts
+        min_cost orders it by, and each table pair holding exactly one team costs lone_cost."""
+        repeats = numpy.cumsum(numpy.arange(self.counts.max(initial=0)) ** self.exponent)
+        lone = sum(self.lone_pairs(order) for order in orders)
+        return float(numpy.concatenate(([0], repeats))[self.counts].sum()) + self.lone_cost*lone
+
+    def table_costs(self, teams, num_slots):
+        """Returns the per-slot cost of each team as nested lists, for use by min_cost."""
+        return self.powered[teams, :num_slots].tolist()
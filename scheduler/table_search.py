@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""Contains optimize_tables, which improves the table assignments of every match at once.
+
+The greedy passes in Tournament.assign_tables choose each match's tables given all the others, so
+they stop at the first assignment no single match can improve. optimize_tables starts from there
+and alternates full sweeps of those exact per-match re-solves with random reshuffles of matches
+that repeat a table, keeping the best assignment found until its time runs out or the assignment
+is provably optimal (its cost reaches lower_bound)."""
+import random
+import time
+import scheduler.min_cost
+import scheduler.profiling as profiling
+
+TOLERANCE = 1e-9 #costs are sums of float powers, so equal ones can differ by rounding
+
+def optimize_tables(orders, costs, time_limit, seed=0, kick=3):
+    """Improves the orderings of every match in place for up to time_limit seconds.
+
+    orders -- each match's ordering of teams across tables (None for an empty table); each must
+              already have been added to costs
+    costs -- the TableCost scoring the assignment
+    seed -- seeds the reshuffles, so a run that finishes within its time is repeatable (default 0)
+    kick -- how many matches each reshuffle changes (default 3)
+    Returns the (cost, lower bound) of the assignment left in orders."""
+    deadline = time.perf_counter() + time_limit
+    rng = random.Random(seed)
+    bound = lower_bound(orders, costs)
+    best = current = descend(orders, costs, deadline, costs.total(orders))
+    best_orders = [list(order) for order in orders]
+    kicks = 0
+    while best > bound + TOLERANCE and time.perf_counter() < deadline:
+        repeats = [i for i, order in enumerate(orders)
+                   if any(team is not None and costs.counts[team, table] > 1
+                          for table, team in enumerate(order))]
+        for i in rng.sample(repeats or range(len(orders)), min(kick, len(repeats or orders))):
+            current += costs.remove(orders[i])
+            rng.shuffle(orders[i])
+            current += costs.add(orders[i])
+        kicks += 1
+        current = descend(orders, costs, deadline, current)
+        if current < best - TOLERANCE:
+            best, best_orders = current, [list(order) for order in orders]
+        else:
+            restore(orders, best_orders, costs)
+            current = best
+    if current != best:
+        restore(orders, best_orders, costs)
+
+    if profiling.enabled:
+        profiling.count('table search kicks', kicks)
+    return best, bound
+
+def descend(orders, costs, deadline, cost):
+    """Re-solves each match's ordering given all the others until a sweep gains nothing.
+
+    cost -- the cost of the assignment in orders, kept up to date from the changes costs reports
+    Returns the cost of the assignment reached (checked against deadline after each match)."""
+    while True:
+        start = cost
+        for order in orders:
+            if time.perf_counter() > deadline:
+                return cost
+            cost += costs.remove(order)
+            order[:] = scheduler.min_cost.min_cost(order, costs)
+            cost += costs.add(order)
+        if cost >= start - TOLERANCE:
+            return cost
+
+def restore(orders, saved, costs):
+    """Sets each ordering back to its saved copy, keeping costs in step."""
+    for order, saved_order in zip(orders, saved):
+        if order != saved_order:
+            costs.remove(order)
+            order[:] = saved_order
+            costs.add(order)
+
+def lower_bound(orders, costs):
+    """Returns a cost that no assignment of the same teams to the same matches can beat.
+
+    Each team plays its matches as evenly as possible across the tables of its widest match, and
+    a match with an odd number of teams must leave one of them without an opponent."""
+    matches, widths = {}, {}
+    for order in orders:
+        for team in order:
+            if team is not None:
+                matches[team] = matches.get(team, 0) + 1
+                widths[team] = max(widths.get(team, 0), len(order))
+    bound = 0
+    for team, num_matches in matches.items():
+        per_table, extra = divmod(num_matches, widths[team])
+        repeats = sum(k ** costs.exponent for k in range(per_table))
+        bound += widths[team]*repeats + extra*per_table ** costs.exponent
+    return bound + costs.lone_cost*sum(len(order) - order.count(None) & 1 for order in orders)
@@ -1,14 +1,20 @@
 #!/usr/bin/env python3
 """A module containing the Team class, for use in FLL tournament scheduling."""
 from datetime import datetime, timedelta
+from scheduler.timeline import Timeline, NEVER, from_seconds, to_seconds
+import scheduler.profiling as profiling
 class Team:
     """An FLL tournament team, storing a numeric ID, a name, a list of events, and a division."""
-    def __init__(self, num, name, div=None):
-        """Constructs a Team using the team's numeric id, name, and division (default=None)."""
+    __slots__ = ('num', 'name', 'div', 'timeline')
+
+    def __init__(self, num, name, div=None, journal=None):
+        """Constructs a Team using the team's numeric id, name, and division (default=None).
+
+        journal -- a list recording event changes so they can be rolled back (default None)"""
         self.num = int(num)
         self.name = name
         self.div = div
-        self.events = []
+        self.timeline = Timeline(journal=journal)
 
     def __str__(self):
         """Returns the str representation of the team. Does not include division."""
@@ -19,19 +25,35 @@ class Team:
         return "Team(num={}, name={}, div={}, events={}".format(self.num, self.name, self.div,
                                                                 self.events)
 
+    @property
+    def events(self):
+        """The team's events as a sorted list of [start_time, duration, activity_id, loc]."""
+        return self.timeline.events
+
+    @events.setter
+    def events(self, events):
+        self.timeline = Timeline(events, self.timeline.journal)
+
     def info(self, with_div=False):
         """Returns a team's numeric ID, division (if true is passed to the function), and name."""
         return [self.num] + with_div*[self.div] + [self.name]
 
     def add_event(self, start_time, duration, activity_id, loc):
-        """Adds an event at to the team's internal listing, then sorts the list of events by time.
+        """Adds an event to the team's internal listing, keeping the events sorted by time.
 
         start_time -- the time the event starts (as a datetime)
         duration -- the duration of the event (as a timedelta)
         activity_id -- a numeric value representing the type of activity
         loc -- a numeric value representing the location the event will happen at"""
-        self.events.append([start_time, duration, activity_id, loc])
-        self.events.sort()
+        self.timeline.insert(start_time, duration, activity_id, loc)
+
+    def add_events(self, events):
+        """Adds many (start_time, duration, activity_id, loc) events at once, as add_event would."""
+        self.timeline.extend(events)
+
+    def remove_event(self, start_time, duration, activity_id, loc):
+        """Removes an event previously added with the same arguments."""
+        self.timeline.remove(start_time, duration, activity_id, loc)
 
     def available(self, new_start, new_length, travel=timedelta(0)):
         """Returns true if the team is available for an new activity.
@@ -39,20 +61,52 @@ class Team:
         new_start -- the time the new activity starts (as a datetime)
         new_length -- the duration of the new activity (as a timedelta)
         travel -- the travel time to allow between activies (as a timedelta, default 0)"""
-        clear = [not (-e_length - travel < e_start - new_start < new_length + travel)
-                 for (e_start, e_length, *others) in self.events]
-        return all(clear)
+        return self.available_secs(to_seconds(new_start), to_seconds(new_length),
+                                   to_seconds(travel))
 
     def next_event(self, time):
         """Returns the first event starting after time (if none, an event at datetime.max)."""
-        return next((e for e in self.events if time < e[0]), (datetime.max, timedelta(0), -1, -1))
+        if profiling.enabled:
+            profiling.count('Team.next_event')
+        idx = self.timeline.after(to_seconds(time))
+        if idx < len(self.timeline):
+            return self.timeline.events[idx]
+        return (datetime.max, timedelta(0), -1, -1)
 
     def next_avail(self, time, duration, travel=timedelta(0)):
-        """Return the next time the team has enough time for the requested activity."""
-        if self.available(time, duration, travel):
+        """Return the next time the team has enough time for the requested activity (or None)."""
+        start = self.next_avail_secs(to_seconds(time), to_seconds(duration), to_seconds(travel))
+        return None if start is None else from_seconds(start)
+
+    #The methods below mirror those above with every time and duration in seconds (as given by
+    #scheduler.timeline.to_seconds), for the scheduling loops that make millions of these calls.
+
+    def available_secs(self, start, length, travel=0):
+        """Returns true if the team is free from start - travel until start + length + travel."""
+        if profiling.enabled:
+            profiling.count('Team.available')
+        return not self.timeline.overlaps(start - travel, start + length + travel)
+
+    def next_event_secs(self, time):
+        """Returns the start of the first event starting after time (if none, timeline.NEVER)."""
+        if profiling.enabled:
+            profiling.count('Team.next_event')
+        idx = self.timeline.after(time)
+        return self.timeline.starts[idx] if idx < len(self.timeline) else NEVER
+
+    def next_avail_secs(self, time, length, travel=0):
+        """Returns the first time from time onwards that the team is available for length, or
+        None if there is none."""
+        if profiling.enabled:
+            profiling.count('Team.next_avail')
+        timeline = self.timeline
+        if not timeline.overlaps(time - travel, time + length + travel):
             return time
-        return next(sum(e[:2], travel) for e in self.events if sum(e[:2], travel) > time and
-                    self.available(sum(e[:2], travel), duration, travel))
+        for idx in range(timeline.reaching(time - travel), len(timeline)):
+            start = timeline.ends[idx] + travel
+            if start > time and not timeline.overlaps(start - travel, start + length + travel):
+                return start
+        return None
 
     def closest_events(self):
         """Returns the time between the two closest events scheduled for the team."""
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""A module containing Timeline, a sorted interval index over a team's scheduled events."""
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+from itertools import accumulate
+
+_EPOCH, _SECOND = datetime.min, timedelta(seconds=1)
+_seconds = {} #a tournament only ever uses a few hundred distinct times and durations
+_times = {}
+
+def to_seconds(time):
+    """Returns a datetime (or a timedelta) as whole seconds since datetime.min."""
+    if time not in _seconds:
+        _seconds[time] = (time - _EPOCH if isinstance(time, datetime) else time) // _SECOND
+    return _seconds[time]
+
+def from_seconds(seconds):
+    """Returns the datetime a number of seconds after datetime.min; reverses to_seconds."""
+    if seconds not in _times:
+        _times[seconds] = _EPOCH + seconds*_SECOND
+    return _times[seconds]
+
+NEVER = to_seconds(datetime.max) #the start of the missing event after a team's last one
+
+class Timeline:
+    """Sorted events with parallel arrays of start/end seconds for O(log n) availability checks.
+
+    events holds [start_time, duration, activity_id, loc] lists in sorted order. starts and ends
+    are the matching start and end times in seconds, and reach[i] is the latest end among the
+    first i + 1 events, so overlapping events (such as temporary lunch blockers) are handled.
+
+    If journal is a list, every insertion and removal is appended to it so that rollback can undo
+    them; a single journal can be shared by many timelines."""
+    __slots__ = ('events', 'starts', 'ends', 'reach', 'journal')
+
+    def __init__(self, events=(), journal=None):
+        """Creates a timeline holding the given events, optionally recording changes to journal."""
+        self.events, self.starts, self.ends, self.reach = [], [], [], []
+        self.journal = None
+        self.extend(events)
+        self.journal = journal
+
+    def __len__(self):
+        return len(self.events)
+
+    def insert(self, start_time, duration, activity_id, loc):
+        """Inserts an event, keeping it after any equal events; returns its index."""
+        event = [start_time, duration, activity_id, loc]
+        idx = bisect_right(self.events, event)
+        self._place(idx, event)
+        if self.journal is not None:
+            self.journal.append((self, idx, None))
+        return idx
+
+    def extend(self, events):
+        """Inserts many events, as insert would one at a time.
+
+        Events that all sort after the current ones are appended; otherwise the arrays are
+        rebuilt once from the merged events."""
+        new = sorted(map(list, events))
+        if self.events and new and new[0] < self.events[-1]:
+            merged = sorted([(event, False) for event in self.events]
+                            + [(event, True) for event in new], key=lambda pair: pair[0])
+            self.events = [event for event, _ in merged]
+            self.starts = [to_seconds(event[0]) for event in self.events]
+            self.ends = [start + to_seconds(event[1])
+                         for start, event in zip(self.starts, self.events)]
+            self.reach = list(accumulate(self.ends, max))
+            added = [idx for idx, (_, is_new) in enumerate(merged) if is_new]
+        else:
+            added = range(len(self.events), len(self.events) + len(new))
+            latest = self.reach[-1] if self.reach else None
+            for event in new:
+                start = to_seconds(event[0])
+                end = start + to_seconds(event[1])
+                latest = end if latest is None else max(latest, end)
+                self.events.append(event)
+                self.starts.append(start)
+                self.ends.append(end)
+                self.reach.append(latest)
+        if self.journal is not None:
+            self.journal.extend((self, idx, None) for idx in added)
+
+    def remove(self, start_time, duration, activity_id, loc):
+        """Removes an event equal to the one given; raises ValueError if there is none."""
+        event = [start_time, duration, activity_id, loc]
+        idx = bisect_left(self.events, event)
+        if idx == len(self.events) or self.events[idx] != event:
+            raise ValueError("{} is not scheduled".format(event))
+        self.pop(idx)
+
+    def pop(self, idx=-1):
+        """Removes and returns the event at the given index (default last)."""
+        idx %= len(self.events)
+        event = self._drop(idx)
+        if self.journal is not None:
+            self.journal.append((self, idx, event))
+        return event
+
+    def overlaps(self, start, end):
+        """Returns true if any event starts before end and ends after start (in seconds)."""
+        idx = bisect_left(self.starts, end)
+        return idx > 0 and self.reach[idx - 1] > start
+
+    def after(self, start):
+        """Returns the index of the first event starting after start (in seconds)."""
+        return bisect_right(self.starts, start)
+
+    def reaching(self, start):
+        """Returns the index of the first event that could end after start (in seconds)."""
+        return bisect_right(self.reach, start)
+
+    def _place(self, idx, event):
+        """Inserts an event at a known index without journaling it."""
+        start = to_seconds(event[0])
+        self.events.insert(idx, event)
+        self.starts.insert(idx, start)
+        self.ends.insert(idx, start + to_seconds(event[1]))
+        self.reach.insert(idx, None)
+        self._update_reach(idx)
+
+    def _drop(self, idx):
+        """Removes and returns the event at a known index without journaling it."""
+        del self.starts[idx], self.ends[idx], self.reach[idx]
+        self._update_reach(idx)
+        return self.events.pop(idx)
+
+    def _update_reach(self, idx):
+        """Recomputes the running maximum of event ends from idx onwards."""
+        latest = self.reach[idx - 1] if idx else None
+        for i in range(idx, len(self.ends)):
+            latest = self.ends[i] if latest is None else max(latest, self.ends[i])
+            self.reach[i] = latest
+
+def rollback(journal, mark):
+    """Undoes every change recorded in journal after mark (an earlier len(journal)), newest first."""
+    while len(journal) > mark:
+        timeline, idx, removed = journal.pop()
+        if removed is None:
+            timeline._drop(idx)
+        else:
+            timeline._place(idx, removed)
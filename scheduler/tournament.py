@@ -1,19 +1,66 @@
 #!/usr/bin/env python3
 """A module containing a Tournament class for using in creating FLL qualifier schedules."""
 from datetime import timedelta, datetime
-from numpy import gcd
+import contextlib
+import itertools
 import math
+import pickle
 import scheduler.util as util
 from scheduler.team import Team
 import scheduler.min_cost
+import scheduler.timeline
+from scheduler.timeline import NEVER, from_seconds, to_seconds
+import scheduler.profiling as profiling
+
+#what schedule_matches reads, and so all a search worker is sent (besides the teams' events)
+SEARCH_ATTRS = ('num_teams', 'travel', 'lunch', 'j_duration', 't_pairs', 't_stagger', 't_consec',
+                't_duration')
+
+_search_versions = itertools.count() #numbers each search state sent to the workers
+_search_tment = (None, None) #a worker's (version, tournament) for the latest state it was sent
+
+def _search_chunk(task):
+    """Evaluates a search_matches chunk of candidates in a worker process, in order, cutting each
+    off at the earliest finish found so far; returns their results.
+
+    task -- (version, state, candidates, bound), with state as returned by search_state; it is
+            only unpickled when its version changes"""
+    global _search_tment
+    version, state, candidates, bound = task
+    if _search_tment[0] != version:
+        _search_tment = (version, Tournament.from_search_state(state))
+    results = []
+    for args in candidates:
+        results.append(_search_tment[1].schedule_matches(*args, bound=bound))
+        if results[-1][1] is not None and (bound is None or results[-1][0] < bound):
+            bound = results[-1][0]
+    return results
+
+def _keep_best(results, best, i, key):
+    """Returns whichever of search results best (an index, or None) and i finishes first (then
+    first by key), dropping the match slots of the other."""
+    if best is None:
+        return i
+    if (results[i][0], key(i)) < (results[best][0], key(best)):
+        best, i = i, best
+    results[i] = (results[i][0], None)
+    return best
 
 class Tournament:
     """A class designed to create schedules for FLL qualifier tournaments."""
     def __init__(self, teams, divisions, scheduling_method, travel, coach_meet, opening, lunch,
                  j_start, j_sets, j_calib, j_duration, j_break,
-                 t_rounds, t_pairs, t_stagger, t_consec, t_duration):
-        """Creates a tournament and requests a roster/settings file if one was not provided."""
-        self.teams = [Team(*x) for x in teams]
+                 t_rounds, t_pairs, t_stagger, t_consec, t_duration, workers=1,
+                 table_time_limit=None, improve_time_limit=None):
+        """Creates a tournament and requests a roster/settings file if one was not provided.
+
+        workers -- the number of processes used to search table schedules (default 1)
+        table_time_limit -- seconds to spend improving the table assignments of all matches at
+                            once after the greedy passes (default None: greedy passes only)
+        improve_time_limit -- seconds to spend improving the finished schedule by local search
+                              (default None: only repair any broken travel or lunch rules)"""
+        self.journal = [] #records team event changes for snapshot/rollback
+        self.teams = [Team(*x, journal=self.journal) for x in teams]
         self.num_teams = len(self.teams)
         self.divisions = divisions
         self.scheduling_method = scheduling_method
@@ -32,11 +79,16 @@ class Tournament:
         self.t_stagger = t_stagger
         self.t_consec = t_consec
         self.t_duration = t_duration
+        self.workers = workers
+        self.search_pool = None #the process pool search_matches uses while scheduling
+        self.table_time_limit = table_time_limit
+        self.improve_time_limit = improve_time_limit
 
         self.divs = []
         self.j_slots = []
         self.t_slots = []
 
+    @profiling.timed
     def schedule(self):
         """Top-level scheduling function; reads data and generates the schedule."""
         for team in self.teams:
@@ -46,13 +98,17 @@ class Tournament:
         print("Starting judge scheduling")
         self.split_divisions()
         if self.scheduling_method == "Interlaced":
-            self.schedule_interlaced()
+            with self.searching():
+                self.schedule_interlaced()
         elif self.scheduling_method == "Block":
             self.schedule_block()
         else:
             raise ValueError("{} scheduling is not supported".format(self.scheduling_method))
-        self.assign_tables()
+        self.assign_tables(time_limit=self.table_time_limit)
+        self.improve(self.improve_time_limit)
+        self.journal.clear() #a finished schedule is never rolled back, so its history can go
 
+    @profiling.timed
     def schedule_interlaced(self):
         """Top-level function controlling judge and table schedules for interlaced tournaments."""
         def run_rate():
@@ -72,7 +128,8 @@ class Tournament:
 
         print("Scheduling competition tables")
 
-        time_increment = max(timedelta(minutes=1), gcd(self.t_duration[0], gcd(*self.j_duration)))
+        time_increment = max(timedelta(minutes=1), util.gcd_time(self.t_duration[0],
+                                                                  *self.j_duration))
         offsets = [i*time_increment for i in range(1, self.t_duration[0] // time_increment)]
         offsets += [i*self.t_duration[0] for i in range(-3, 4)]
         offsets += [-x for x in offsets[1:]]
@@ -81,20 +138,23 @@ class Tournament:
         current, time_start = None, earliest
         best = ((datetime.max - self.travel, []), 0, earliest)
         while not current:
-            current = min(((self.schedule_matches(time_start + offset, t, run_rate(),
-                                                  range(self.t_rounds)[:2], True, jlunch, jend),
-                                                  t, time_start + offset)
-                           for t in range(self.num_teams) for offset in offsets
-                           if time_start + offset >= earliest),
-                          key=lambda x: (x[0][0], x[0][0] - x[2])) 
+            starts = [(t, time_start + offset) for t in range(self.num_teams) for offset in offsets
+                      if time_start + offset >= earliest]
+            results = self.search_matches([(start, t, run_rate(), range(self.t_rounds)[:2], True,
+                                            jlunch, jend) for t, start in starts], best[0][0],
+                                          lambda i: (earliest - starts[i][1], i))
+            current = min(((result, t, start) for result, (t, start) in zip(results, starts)),
+                          key=lambda x: (x[0][0], x[0][0] - x[2]))
             if (current[0][0], current[0][0] - current[2]) < (best[0][0], best[0][0] - best[2]):
                 best, current = current, False
                 (end, self.t_slots), team_start, time_start = best 
 
         if self.t_rounds > 1: #determine run settings for afternoon table rounds
+            before_lunch = self.snapshot()
             for team in self.teams:
-                team.add_event(team.next_avail(self.lunch[0], self.lunch[2]),
-                               self.lunch[2], -1, -1)
+                start = team.next_avail(self.lunch[0], self.lunch[2])
+                if start is not None: #a team without time for lunch is reported by validate
+                    team.add_event(start, self.lunch[2], -1, -1)
 
             match_times = [(times[0], times[self.t_stagger] + self.t_duration[rnd])
                            for times, rnd, teams in self.t_slots
@@ -105,12 +165,14 @@ class Tournament:
 
             current, end = None, datetime.max
             while not current:
-                current = min((self.schedule_matches(time_start + self.t_duration[2] + offset,
-                                                     (t_off + team_start) % self.num_teams,
-                                                     None, range(self.t_rounds - 2))[0],
-                              time_start + self.t_duration[2] + offset, t_off)
-                              for offset in [tdelta for tdelta in offsets if tdelta >= timedelta(0)]
-                              for t_off in range(math.ceil(self.num_teams / 2)))
+                starts = [(time_start + self.t_duration[2] + offset, t_off)
+                          for offset in [tdelta for tdelta in offsets if tdelta >= timedelta(0)]
+                          for t_off in range(math.ceil(self.num_teams / 2))]
+                results = self.search_matches([(start, (t_off + team_start) % self.num_teams, None,
+                                                range(self.t_rounds - 2)) for start, t_off in starts],
+                                              end, starts.__getitem__)
+                current = min((result[0], start, t_off)
+                              for result, (start, t_off) in zip(results, starts))
                 if current[:2] < (end, time_start):
                     end, time_start, t_offset = current
                     current = False
@@ -122,34 +184,76 @@ class Tournament:
                              range(1, int((time_start - self.t_slots[-1][0][0]) / self.t_duration[0]))]
  
             self.t_slots += self.schedule_matches(time_start, team_start, None, range(2, self.t_rounds))[1]
-            for team in self.teams:
-                team.events = [event for event in team.events if event[2] != -1]
+            self.rollback(before_lunch)
 
+    @profiling.timed
     def judge_interlaced(self): 
         """Generates the judging schedule for tournaments using interlaced scheduling.
         
            Does not work for tournaments with calibration rounds"""
-        max_room = max(math.ceil(len(teams) / rooms) for rooms, teams in self.divs)
-        self.divs = [(rooms, util.rpad(teams, util.round_to(len(teams), rooms), None))
-                     for rooms, teams in self.divs]
-        self.divs = [(rooms, sum(util.mpad(util.chunks(teams, rooms),
-                                           max_room, rooms * [None]), []))
-                     for rooms, teams in self.divs]
+        queues = self.judge_queues()
+        max_room = queues.shape[1]
+        self.set_judge_slots(queues, [math.ceil(i * max_room / 3) for i in range(3)])
 
-        max_room = max(math.ceil(len(div_teams) / rooms) for rooms, div_teams in self.divs)
-        jrooms = [div_teams[i::rooms] for rooms, div_teams in self.divs for i in range(rooms)]
-        jrooms = [util.rotate(jrooms[room], math.ceil(i * max_room / 3)) for i in range(3)
-                  for room in range(self.j_sets)]
+        return self.assign_judge_times()
 
-        self.teams = list({team : None for room in zip(*jrooms) for team in room if team is not None})
-        team_dict = {team : i for i, team in enumerate(self.teams)}
-        team_dict[None] = None
+    @profiling.timed
+    def judge_block(self):
+        """Generates the judging schedule for tournaments using block scheduling.
 
-        jrooms = [[team_dict[team] for team in room] for room in jrooms]
-        self.j_slots = [util.chunks(tslot, self.j_sets) for tslot in zip(*jrooms)]
+           Every category sees each room's teams in the same (rotated) order, each a few sessions
+           after the category before it: the fewest that leave teams time to travel between rooms.
+           So most teams are judged in one short block. Does not work for tournaments with
+           calibration rounds"""
+        queues = self.judge_queues()
+        lag = min(math.ceil((self.travel + self.j_duration[1]) / self.j_duration[0]),
+                  max(1, queues.shape[1] // 3))
+        self.set_judge_slots(queues, [-i*lag for i in range(3)])
 
         return self.assign_judge_times()
 
+    def judge_queues(self):
+        """Pads self.divs so every judging room sees the same number of teams.
+
+        Returns a rooms x turns array of the teams each room sees in turn, as indices into
+        self.teams (-1 for none). A division's teams fill its rooms a row at a time, with empty
+        rows spread through (at util.mpad_positions) to pad it to the longest queue."""
+        import numpy as np #deferred, as in assign_tables
+        max_room = max(math.ceil(len(teams) / rooms) for rooms, teams in self.divs)
+        index = {team: i for i, team in enumerate(self.teams)}
+        queues = []
+        for rooms, teams in self.divs:
+            rows = math.ceil(len(teams) / rooms)
+            div_teams = np.full(rows*rooms, -1, dtype=np.intp)
+            div_teams[:len(teams)] = [-1 if team is None else index[team] for team in teams]
+            filled = np.ones(max_room, dtype=bool)
+            filled[util.mpad_positions(rows, max_room)] = False
+            padded = np.full((max_room, rooms), -1, dtype=np.intp)
+            padded[filled] = div_teams.reshape(rows, rooms)
+            queues.append(padded.T)
+
+        self.divs = [(rooms, [None if i < 0 else self.teams[i] for i in queue.T.ravel()])
+                     for (rooms, _), queue in zip(self.divs, queues)]
+        return np.concatenate(queues)
+
+    def set_judge_slots(self, queues, shifts):
+        """Sets self.j_slots so each category's rooms see their queues rotated by its shift.
+
+        The slot x category x room grid is built as one array. self.teams is reordered by first
+        judging session, and j_slots refer to teams by index."""
+        import numpy as np
+        turns = (np.arange(queues.shape[1])[:, None] + shifts) % queues.shape[1]
+        grid = queues[:, turns].transpose(1, 2, 0)
+        judged = grid[grid >= 0]
+        order = judged[np.sort(np.unique(judged, return_index=True)[1])]
+        self.teams = [self.teams[i] for i in order]
+        renumber = np.full(queues.max() + 1, -1, dtype=np.intp)
+        renumber[order] = np.arange(len(order))
+        slots = np.where(grid >= 0, renumber[grid], -1).astype(object)
+        slots[grid < 0] = None
+        self.j_slots = slots.tolist()
+
+    @profiling.timed
     def judge_interlaced_calib(self):
         """Generates the judging schedule for tournaments using interlaced scheduling.
         
@@ -166,115 +270,344 @@ class Tournament:
 
         return self.assign_judge_times()
 
+    @profiling.timed
     def schedule_block(self):
-        """Generates judging and table schedules using block scheduling."""
-        raise NotImplementedError("Block scheduling is not implemented yet")
+        """Top-level function controlling judge and table schedules for block tournaments.
+
+        Judging is done in blocks (see judge_block) and each table round runs in its own window
+        of back to back matches on every table, so the table schedule is built in a single pass
+        (see block_matches) rather than searched for as in schedule_interlaced. The only choice
+        tried both ways is lunch: together in the judges' lunch break, if there is one, or spread
+        over the lunch window to keep the tables busy. Whichever finishes first is kept."""
+        jlunch, _ = self.judge_interlaced_calib() if self.j_calib else self.judge_block()
 
+        print("Scheduling competition tables")
+        time_start = max(sum(self.opening, 2*self.travel), self.j_slots[0][0])
+        best = None
+        for together in ([True] if jlunch is not None else []) + [False]:
+            before_lunch = self.snapshot()
+            for i, team in enumerate(self.teams):
+                start = jlunch - self.j_duration[1] + self.travel if together else \
+                        self.lunch[0] + i*(self.lunch[1] - self.lunch[0])/self.num_teams
+                start = team.next_avail(start, self.lunch[2])
+                if start is None or start > self.lunch[1]:
+                    start = team.next_avail(self.lunch[0], self.lunch[2])
+                if start is not None:
+                    team.add_event(start, self.lunch[2], -1, -1)
+            tslots = self.block_matches(time_start)
+            self.rollback(before_lunch)
+            finish = tslots[-1][0][0] + self.t_duration[tslots[-1][1]]
+            if best is None or finish < best[0]:
+                best = (finish, tslots)
+        self.t_slots = best[1]
+
+    @profiling.timed
+    def block_matches(self, time_next):
+        """Returns table slots (as in matches_inner) for every round, from time_next.
+
+        Matches of up to 2*t_pairs teams run back to back, each for the earliest round that a team
+        still waiting to play it is free for. A match takes the waiting teams that are free for it,
+        those with the soonest other event first; if none are free, or t_consec matches have run in
+        a row, the tables sit out a match. So rounds run one after another on every table, except
+        that teams held up by judging play their round later while the others move on. A match
+        after a longer round waits until the staggered half of the tables is clear of it."""
+        travel, time_next = to_seconds(self.travel), to_seconds(time_next)
+        durations = [to_seconds(duration) for duration in self.t_duration]
+        windows = [(1.5 if self.t_stagger else 1)*duration for duration in durations]
+        next_rnd = self.num_teams*[0] #the round each team plays next
+        ready = self.num_teams*[time_next] #when each team is back from its last match
+        waiting = list(range(self.num_teams))
+        tslots, consec = [], 0
+        staggered_free = time_next #when the staggered half of the tables is clear
+        while waiting:
+            rounds, match = sorted({next_rnd[t] for t in waiting}), []
+            for rnd in rounds if consec < self.t_consec else ():
+                free = sorted((self.teams[t].next_event_secs(time_next), t) for t in waiting
+                              if next_rnd[t] == rnd and ready[t] <= time_next
+                              and self.teams[t].available_secs(time_next, windows[rnd], travel))
+                match = sorted(t for _, t in free[:2*self.t_pairs])
+                if match:
+                    break
+            if not match:
+                rnd = rounds[0]
+            elif self.t_stagger and time_next + durations[rnd] / 2 < staggered_free:
+                time_next = staggered_free - durations[rnd] / 2
+                continue
+            consec = consec + 1 if match else 0
+            for t in match:
+                next_rnd[t] += 1
+                ready[t] = time_next + windows[rnd] + travel
+            if match:
+                staggered_free = time_next + windows[rnd]
+            waiting = [t for t in waiting if next_rnd[t] < self.t_rounds]
+            tslots.append([(from_seconds(time_next), from_seconds(time_next + durations[rnd] / 2)),
+                           rnd, util.rpad(match, 2*self.t_pairs, None)])
+            time_next += durations[rnd]
+
+        return tslots
+
+    @profiling.timed
     def split_divisions(self):
-        """Sets self.divs to a list of (rooms for teams, teams) based on division."""
+        """Sets self.divs to a list of (rooms for teams, teams) based on division.
+
+        Each division is judged in rooms of its own unless that would put more than max_room
+        teams through a room, in which case as few teams as possible are judged together in one
+        mixed group (see separable). Of the splits mixing that few, the one seeing the fewest
+        teams in its busiest room is kept, and spare rooms go one at a time to the group with the
+        most teams per room. Divisions are taken in sorted order, so the split is deterministic."""
         max_room = max(12, math.ceil(self.num_teams / self.j_sets) + 1)
         rm_divs = [[team for team in self.teams if team.div == div]
-                     for div in {team.div for team in self.teams}]
-        rm_divs = [(math.ceil(len(div) / max_room), div) for div in rm_divs]
-        
-        total_room_req = sum(rooms for rooms, _ in rm_divs)
-        if total_room_req > self.j_sets:
-            self.divs, mixed_div = [], []
-            teams_left, rooms_left = self.num_teams, self.j_sets
-            for rooms_req, div_teams in rm_divs:
-                if teams_left - len(div_teams) <= (rooms_left - rooms_req) * max_room:
-                    self.divs.append((rooms_req, div_teams))
-                    teams_left -= len(div_teams)
-                    rooms_left -= rooms_req
-                else:
-                    mixed_div += div_teams
-            if teams_left:
-                self.divs.append((rooms_left, mixed_div))
-        else:
-            self.divs = rm_divs
-            for i in range(self.j_sets - total_room_req):
-                _, slow_div = max((len(teams) / rooms, idx)
-                                  for idx, (rooms, teams) in enumerate(self.divs))
-                rooms, teams = self.divs[slow_div]
-                self.divs[slow_div] = (rooms + 1, teams)
+                   for div in sorted({team.div for team in self.teams})]
+        sizes = [len(div) for div in rm_divs]
+
+        best = None
+        for load in range(math.ceil(self.num_teams / self.j_sets), max_room + 1):
+            kept = self.separable(sizes, load)
+            mixed = self.num_teams - sum(sizes[i] for i in kept)
+            if best is None or mixed < best[0]:
+                best = (mixed, load, kept)
+        _, load, kept = best
+        self.divs = [(math.ceil(sizes[i] / load), rm_divs[i]) for i in kept]
+        mixed_div = [team for i, div in enumerate(rm_divs) if i not in kept for team in div]
+        if mixed_div:
+            self.divs.append((math.ceil(len(mixed_div) / load), mixed_div))
+
+        for i in range(self.j_sets - sum(rooms for rooms, _ in self.divs)):
+            _, slow_div = max((len(teams) / rooms, idx)
+                              for idx, (rooms, teams) in enumerate(self.divs))
+            rooms, teams = self.divs[slow_div]
+            self.divs[slow_div] = (rooms + 1, teams)
         self.divs.sort(key=lambda x: sorted(list({team.div for team in x[1] if team})))
+
+    def separable(self, sizes, load):
+        """Returns the indices of the divisions (of the given sizes) to judge in rooms of their
+        own, leaving as few teams as possible to a mixed group, with at most load teams per room.
+
+        An exact 0/1 knapsack over divisions and rooms: each division kept apart takes
+        ceil(size / load) rooms, and the mixed group takes enough for the rest."""
+        most = {0: (0, ())} #rooms used -> (most teams kept apart in them, the divisions kept)
+        for i, size in enumerate(sizes):
+            need = math.ceil(size / load)
+            for rooms, (teams, kept) in list(most.items()):
+                if rooms + need <= self.j_sets and most.get(rooms + need, (-1,))[0] < teams + size:
+                    most[rooms + need] = (teams + size, kept + (i,))
+        total = sum(sizes)
+        return max((teams, kept) for rooms, (teams, kept) in most.items()
+                   if rooms + math.ceil((total - teams) / load) <= self.j_sets)[1]
  
+    @profiling.timed
     def assign_judge_times(self):
         """Determines when each judging session will happen and assigns teams to those slots."""
         if self.j_break[0] > 1 and math.ceil((len(self.j_slots) - self.j_calib - 1) / self.j_break[0])\
                 == math.ceil((len(self.j_slots) - self.j_calib - 1) / (self.j_break[0] - 1)):
                     self.j_break = (self.j_break[0] - 1, self.j_break[1])
 
+        import numpy as np #deferred, as in assign_tables
+        travel, j_break = to_seconds(self.travel), to_seconds(self.j_break[1])
+        judge_len, team_len = map(to_seconds, self.j_duration)
         breaks = range(self.j_calib, len(self.j_slots) - 1, self.j_break[0])
         breaks = sorted(list({0, len(self.j_slots)} | set(breaks)))
-        times = [[self.j_start + bool(i and self.j_calib)*self.travel
-                  + max(i - self.j_calib, 0)*self.j_break[1] + j*self.j_duration[0]
-                  for j in range(breaks[i], breaks[i+1] + 1)] for i in range(len(breaks) - 1)]
-        j_blockers = [(start - self.travel, duration + 2*self.travel) for start, duration
-                      in (self.opening, self.coach_meet)] + [self.lunch[1:]]
+
+        #every judging cycle between breaks, ends included, laid end to end as one array
+        cycle = np.repeat(np.arange(len(breaks) - 1), np.diff(breaks) + 1)
+        lasts = np.cumsum(np.diff(breaks) + 1) - 1
+        times = (to_seconds(self.j_start) + ((cycle > 0) & bool(self.j_calib))*travel
+                 + np.maximum(cycle - self.j_calib, 0)*j_break
+                 + (np.arange(len(cycle)) - cycle)*judge_len)
+        j_blockers = [(to_seconds(start) - travel, to_seconds(duration) + 2*travel)
+                      for start, duration in (self.opening, self.coach_meet)]
+        j_blockers += [tuple(map(to_seconds, self.lunch[1:]))]
 
         for start, length in sorted(j_blockers):
-            delay = max(timedelta(0), min(length, start + length - times[0][0]))
-            delay -= self.j_break[1] if start >= times[0][-1] else timedelta(0)
-            times = [[time + (start < cycle[-1])*delay for time in cycle] for cycle in times]
-        times = [time for cycle in times for time in cycle]
-        tdeltas = [(times[i + 1] - times[i], times[i] + self.j_duration[1]) for i in range(len(times) - 1)]
-        lunch = max(tdeltas)[1] + self.j_duration[0] if max(tdeltas)[0] >= self.lunch[2] else None
+            delay = max(0, min(length, start + length - int(times[0])))
+            delay -= j_break if start >= times[lasts[0]] else 0
+            times += np.where(start < times[lasts], delay, 0)[cycle]
+        gaps = np.diff(times)
+        longest = len(gaps) - 1 - int(np.argmax(gaps[::-1])) #the latest of the longest gaps
+        lunch = from_seconds(int(times[longest]) + team_len + judge_len) \
+                if gaps[longest] >= to_seconds(self.lunch[2]) else None
+        times = [from_seconds(time) for time in times.tolist()]
 
         for breaktime in breaks[-2:0:-1]:
             self.j_slots.insert(breaktime, None)
         self.j_slots = list(zip(times, self.j_slots))
+        events = {}
         for time, teams in filter(lambda x: x[1] is not None, self.j_slots):
             for cat, cat_teams in enumerate(teams):
                 for room, team in filter(lambda x: x[1] is not None, enumerate(cat_teams)):
-                    self.teams[team].add_event(time, self.j_duration[1], cat + 2, room)
+                    events.setdefault(team, []).append((time, self.j_duration[1], cat + 2, room))
+        for team, team_events in events.items():
+            self.teams[team].add_events(team_events)
         for i in range(len(self.j_slots) - 1, 0, -1):
             if self.j_slots[i][0] == self.j_slots[i - 1][0]:
                 del self.j_slots[i - 1]
         return lunch, self.j_slots[-1][0] + self.j_duration[1]
     
-    def schedule_matches(self, time_next, team_next, run_rate, rounds, lunch=False, jlunch=None, jend=None):
-        time_finish, tslots = self.matches_inner(time_next, team_next, run_rate, rounds)
+    @contextlib.contextmanager
+    def searching(self):
+        """Keeps a pool of self.workers processes open for search_matches, if more than one."""
+        if self.workers <= 1:
+            yield
+            return
+        from concurrent.futures import ProcessPoolExecutor #only needed when parallel
+        with ProcessPoolExecutor(self.workers) as pool:
+            self.search_pool = pool
+            try:
+                yield
+            finally:
+                self.search_pool = None
+
+    def search_state(self):
+        """Returns the settings and team events schedule_matches reads, pickled, so the search
+        workers are sent a fixed copy of them rather than the whole tournament."""
+        return pickle.dumps(({attr: getattr(self, attr) for attr in SEARCH_ATTRS},
+                             [[tuple(event) for event in team.events] for team in self.teams]))
+
+    @classmethod
+    def from_search_state(cls, state):
+        """Returns a tournament, missing everything but what schedule_matches reads, from a
+        state returned by search_state."""
+        attrs, events = pickle.loads(state)
+        tment = cls.__new__(cls)
+        tment.__dict__.update(attrs)
+        tment.journal = []
+        tment.teams = [Team(i, None, journal=tment.journal) for i in range(len(events))]
+        for team, team_events in zip(tment.teams, events):
+            team.events = team_events
+        return tment
+
+    @profiling.timed
+    def search_matches(self, candidates, bound=None, key=None):
+        """Returns schedule_matches(*args) for each candidate args tuple, in order.
+
+        key -- ranks candidates that finish at the same time as the caller will, given the index
+               of a candidate (default: by index)
+
+        Any candidate that cannot finish by bound, or by the earliest finish found so far, is cut
+        off early and returned as (a lower bound on its finish, None). Candidates are visited in
+        order of matches_bound so good finishes are found first.
+
+        While scheduling with more than one worker, the candidates are split into chunks that the
+        search pool evaluates, a few at a time, against a copy of search_state sent with each
+        chunk; every chunk is cut off at the earliest finish found when it is sent. The earliest
+        finish is never cut off, so the choice is the same as the serial path's.
+
+        Only the candidate finishing first (then first by key) can be chosen, so every other is
+        returned as (its finish, None), its match slots dropped as soon as a better candidate is
+        found rather than held until the search ends."""
+        key = key or (lambda i: i)
+        order = sorted(range(len(candidates)), key=lambda i: (self.matches_bound(
+            candidates[i][0], len(candidates[i][3])*self.num_teams, *candidates[i][2:4]), i))
+        results, best, pruned = len(candidates)*[None], None, 0
+        def record(i, result):
+            nonlocal bound, best, pruned
+            results[i] = result
+            if result[1] is None:
+                pruned += 1
+                return
+            if bound is None or result[0] < bound:
+                bound = result[0]
+            best = _keep_best(results, best, i, key)
+
+        if self.search_pool is None or len(candidates) < 2:
+            for i in order:
+                record(i, self.schedule_matches(*candidates[i], bound=bound))
+        else:
+            from concurrent.futures import wait, FIRST_COMPLETED
+            version, state = next(_search_versions), self.search_state()
+            size = math.ceil(len(order) / (4*self.workers))
+            chunks = iter([order[i:i + size] for i in range(0, len(order), size)])
+            running = {}
+            def submit():
+                chunk = next(chunks, None)
+                if chunk is not None:
+                    task = (version, state, [candidates[i] for i in chunk], bound)
+                    running[self.search_pool.submit(_search_chunk, task)] = chunk
+            for _ in range(2*self.workers):
+                submit()
+            while running:
+                for future in wait(running, return_when=FIRST_COMPLETED)[0]:
+                    for i, result in zip(running.pop(future), future.result()):
+                        record(i, result)
+                    submit()
+
+        if profiling.enabled:
+            profiling.count('search candidates evaluated', len(results))
+            profiling.count('search candidates pruned', pruned)
+        return results
+
+    def schedule_matches(self, time_next, team_next, run_rate, rounds, lunch=False, jlunch=None,
+                         jend=None, bound=None):
+        """Schedules table matches, retrying with a lunch break for every team if they run late.
+
+        bound -- give up, returning (a lower bound on the finish, None), once the matches cannot
+                 finish by this time (default None)"""
+        first_bound = max(bound, self.lunch[1]) if lunch and bound is not None else bound
+        time_finish, tslots = self.matches_inner(time_next, team_next, run_rate, rounds,
+                                                 first_bound)
         if lunch and time_finish > self.lunch[1]:
             if jend is not None:
                 lunch_time = (jlunch or jend) - self.j_duration[1]
             else:
                 lunch_time = self.lunch[1] - self.travel
         
+            trial = self.snapshot()
             for team in self.teams:
                 team.add_event(lunch_time + self.travel, self.lunch[2], -1, None)
-            time_finish, tslots = self.matches_inner(time_next, team_next, run_rate, rounds)
-            for team in self.teams:
-                team.events = [ev for ev in team.events if ev[2] != -1]
+            time_finish, tslots = self.matches_inner(time_next, team_next, run_rate, rounds, bound)
+            self.rollback(trial)
 
         return time_finish, tslots
 
-    def matches_inner(self, time_next, team_next, run_rate, rounds):
-        """Determines when table matches will occur and assigns teams to matches."""
+    def matches_bound(self, time_next, teams_left, run_rate, rounds):
+        """Returns the earliest time teams_left more match appearances could possibly end by."""
+        match_size = 2*min(math.ceil((run_rate or 2*self.t_pairs)/2), self.t_pairs)
+        return time_next + math.ceil(teams_left / match_size)*min(self.t_duration[rnd]
+                                                                  for rnd in rounds)
+
+    @profiling.timed
+    def matches_inner(self, time_next, team_next, run_rate, rounds, bound=None):
+        """Determines when table matches will occur and assigns teams to matches.
+
+        bound -- give up, returning (a lower bound on the finish, None), once the matches cannot
+                 finish by this time (default None)
+
+        Times are tracked in whole seconds (see scheduler.timeline.to_seconds) and only converted
+        to datetimes for the match slots and the finish returned."""
+        travel, time_next = to_seconds(self.travel), to_seconds(time_next)
+        durations = [to_seconds(duration) for duration in self.t_duration]
         ideal_run_rate = 2*min(math.ceil((run_rate or 2*self.t_pairs)/2), self.t_pairs)
+        if bound is not None:
+            bound = to_seconds(bound)
+            shortest = min(durations[rnd] for rnd in rounds)
 
         def delay(t):
-            return self._team(t + team_next).next_avail(time_next, window, self.travel) - time_next
+            start = self._team(t + team_next).next_avail_secs(time_next, window, travel)
+            return (NEVER if start is None else start) - time_next
 
         consec = 0
         last_nonnull, prev_nonnull = -1, -1
         tslots = []
         teams_left = len(rounds)*self.num_teams
         while teams_left > 0:
+            if bound is not None:
+                finish = time_next + math.ceil(teams_left / ideal_run_rate)*shortest
+                if finish > bound:
+                    return from_seconds(finish), None
             rnd = rounds[len(rounds) - ((teams_left - 1) // self.num_teams + 1)]
-            window = (1.5 if self.t_stagger else 1)*self.t_duration[rnd]
-            run_rate = min(util.round_to(self.num_teams / math.ceil(self.travel / self.t_duration[rnd]
+            window = (1.5 if self.t_stagger else 1)*durations[rnd]
+            run_rate = min(util.round_to(self.num_teams / math.ceil(travel / durations[rnd]
                                                                     + (3/2 if self.t_stagger else 1)), -2),
                            ideal_run_rate)
             match_sizes = (max(2, run_rate - 2), run_rate)
 
             max_teams, num_matches = next(filter(delay, range(teams_left)), teams_left), 0
             if max_teams:
-                num_matches = math.floor((min(self._team(t + team_next).next_event(time_next)[0]
+                num_matches = math.floor((min(self._team(t + team_next).next_event_secs(time_next)
                                               for t in range(max_teams))
-                                         - time_next - self.travel - int(self.t_stagger)*self.t_duration[rnd]/2) 
-                                         / self.t_duration[rnd])
-                num_matches = min(num_matches, math.ceil(delay(max_teams) / self.t_duration[rnd]
+                                         - time_next - travel - int(self.t_stagger)*durations[rnd]/2)
+                                         / durations[rnd])
+                num_matches = min(num_matches, math.ceil(delay(max_teams) / durations[rnd]
                                                          or teams_left / match_sizes[-1]))
             if max_teams < min(match_sizes) or num_matches == 0 or consec >= self.t_consec:
                 consec = 0
@@ -287,9 +620,9 @@ class Tournament:
 
             for match_size in next_matches:
                 timeslot = [(t + team_next) % self.num_teams for t in range(match_size)]
-                tslots += [[(time_next, time_next + self.t_duration[rnd] / 2), rnd,
-                                  util.rpad(timeslot, match_sizes[-1], None)]]
-                time_next += self.t_duration[rnd]
+                tslots += [[(from_seconds(time_next), from_seconds(time_next + durations[rnd] / 2)),
+                            rnd, util.rpad(timeslot, match_sizes[-1], None)]]
+                time_next += durations[rnd]
                 team_next, teams_left = team_next + match_size, teams_left - match_size
             consec += len(next_matches) if next_matches != [0] else 0
 
@@ -297,52 +630,82 @@ class Tournament:
                 prev_nonnull = len(tslots) - 2 if len(next_matches) > 1 else last_nonnull
                 last_nonnull = len(tslots) - 1
             elif last_nonnull == 0 or (last_nonnull - prev_nonnull > 1):
-                window = (1 + self.t_stagger/2)*self.t_duration[tslots[last_nonnull][1]]
-                if all(self.teams[team].available(tslots[-1][0][0], window, self.travel)
+                window = (1 + self.t_stagger/2)*durations[tslots[last_nonnull][1]]
+                if all(self.teams[team].available_secs(to_seconds(tslots[-1][0][0]), window, travel)
                        for team in tslots[last_nonnull][2] if team is not None):
                     tslots[-1][1:], tslots[last_nonnull][1:] = tslots[last_nonnull][1:], tslots[-1][1:]
                     last_nonnull = len(tslots) - 1
                     consec = 1
 
-        return time_next, tslots
+        return from_seconds(time_next), tslots
 
-    def assign_tables(self, assignment_passes=2):
-        """Reorders the teams in self.t_slots to minimize table repetition for teams."""
-        prev_tables = [[0 for i in range(2*self.t_pairs)] for j in range(self.num_teams)]
-        def cost(order):
-            val = sum(prev_tables[team][table]**1.1 for table, team in enumerate(order)
-                      if team is not None)
-            val += sum(self.t_rounds + 1 for i in range(0, len(order) - 1, 2) if
-                       (order[i] is None) != (order[i + 1] is None))
-            return val
+    @profiling.timed
+    def assign_tables(self, assignment_passes=2, time_limit=None):
+        """Reorders the teams in self.t_slots to minimize table repetition for teams.
+
+        time_limit -- after the greedy passes, spend up to this many seconds improving every
+                      match's tables at once (see scheduler.table_search; default None)"""
+        from scheduler.table_cost import TableCost #defers importing numpy until needed
+        costs = TableCost(self.num_teams, 2*self.t_pairs, self.t_rounds + 1)
+        greedy = 0 #the cost of the assignment so far, from the changes costs reports
 
         #the current approach only changes one match at a time; multiple passes fix bad early calls
         for assign_pass in range(assignment_passes):
             rotation = 0
             for(times, rnd, teams) in filter(None, self.t_slots):
                 if assign_pass:
-                    for table, team in filter(lambda x: x[1] is not None, enumerate(teams)):
-                        prev_tables[team][table] -= 1
+                    greedy += costs.remove(teams)
                 else:
                     rotation += sum(2 for i in range(0, len(teams) - 1, 2)
                                     if teams[i] is teams[i + 1] is None)
                     rotation %= len(teams)
-                teams[:] = scheduler.min_cost.min_cost(teams[rotation:] + teams[:rotation], cost)
-                for table, team in filter(lambda x: x[1] is not None, enumerate(teams)):
-                    prev_tables[team][table] += 1
+                teams[:] = scheduler.min_cost.min_cost(teams[rotation:] + teams[:rotation], costs)
+                greedy += costs.add(teams)
+
+        if time_limit:
+            from scheduler.table_search import optimize_tables
+            orders = [teams for times, rnd, teams in filter(None, self.t_slots)]
+            cost, bound = optimize_tables(orders, costs, time_limit)
+            print("Table assignment cost {:.2f} (greedy {:.2f}, lower bound {:.2f}{})".format(
+                cost, greedy, bound, ", optimal" if cost <= bound + 1e-9 else ""))
 
         tbl_order = [2*j + k for i in range(2) for j in range(i, self.t_pairs, 2) for k in range(2)]
-        for (times, rnd, teams) in filter(None, self.t_slots):
-            teams[:] = util.rpad(teams, 2*self.t_pairs, None)
-            teams[:] = [teams[tbl if self.t_stagger else i] for i, tbl in enumerate(tbl_order)]
+        for (times, rnd, teams) in filter(None, self.t_slots): #pads, reorders and pairs in one pass
+            padded = util.rpad(teams, 2*self.t_pairs, None)
             teams[:] = [(team, sum(event[2] > 4 for event in self._team(team).events)
-                                   if team is not None else None) for team in teams]
+                               if team is not None else None)
+                        for team in (padded[tbl if self.t_stagger else i]
+                                     for i, tbl in enumerate(tbl_order))]
             for table, (team, team_rnd) in filter(lambda x: x[1] != (None, None), enumerate(teams)):
                 self._team(team).add_event(times[table >= util.round_to(self.t_pairs, 2)
                                                  and self.t_stagger],
                                            self.t_duration[rnd], 5 + team_rnd, table)
         self.clean_tslots()
 
+    @profiling.timed
+    def improve(self, time_limit=None):
+        """Improves the finished schedule by local search (see scheduler.improve).
+
+        time_limit -- seconds to search for (default None: only repair broken travel or lunch rules)"""
+        from scheduler.improve import improve_schedule
+        before, after = improve_schedule(self, time_limit)
+        if after < before:
+            print("Improved the schedule's score from {:.1f} to {:.1f}".format(before, after))
+
+    def update_roster(self, drop=(), add=()):
+        """Drops and adds teams in the finished schedule, leaving every other team's events as
+        they were (see scheduler.roster).
+
+        drop -- the numbers of the teams to remove
+        add -- a (number, name[, division]) row for each team to add
+        Returns the teams whose events changed."""
+        from scheduler.roster import update_roster
+        moved = update_roster(self, drop, add)
+        for team in moved:
+            print("{} scheduled at {}".format(team, ', '.join(
+                event[0].strftime('%H:%M') for event in team.events[2:])))
+        return moved
+
     def clean_tslots(self):
         """Consolidates idle matches in self.t_slots."""
         def isnull(idx):
@@ -362,6 +725,14 @@ class Tournament:
             else:
                 idx += 1
 
+    def snapshot(self):
+        """Returns a marker for undoing every team event change made after this call."""
+        return len(self.journal)
+
+    def rollback(self, snapshot):
+        """Undoes every team event change made since snapshot was taken, in O(changes)."""
+        scheduler.timeline.rollback(self.journal, snapshot)
+
     def _team(self, team_num):
         """Returns the team at the specified internal index; wraps modularly."""
         return self.teams[team_num % self.num_teams]
@@ -1,5 +1,6 @@
 #  !/usr/bin/env python3
 import math
+from datetime import timedelta
 """Utility functions for the fll tournament scheduler."""
 def sum_to(options, goal, picks, force_take_all=False):
     """Returns numbers that sum as close to a goal value as possible.
@@ -34,12 +35,14 @@ def rpad(ls, size, val):
     """Right-pads a list with a prescribed value to a set length."""
     return ls + (size - len(ls))*[val]
 
-def mpad(ls, size, val):
-    if size > len(ls):
-        step = 1 / (size / len(ls) - 1)
-        for i in range(size - len(ls), 0, -1):
-            ls.insert(int((i + 1/2) * step), val)
-    return ls
+def mpad_positions(length, size):
+    """Returns the indices, in order, of the padding that spreads a list of length items evenly
+    through size places."""
+    pads = size - length
+    if pads <= 0:
+        return []
+    step = 1 / (size / length - 1)
+    return [min(int((i + 1/2) * step), length + pads - i) + i - 1 for i in range(1, pads + 1)]
 
 def first_at_least(ls, minimum):
     """Returns the first N elements of a list that sum to at least minimum (in-order)."""
@@ -49,9 +52,10 @@ def first_at_least(ls, minimum):
         idx += 1
     return ls[:idx]
 
-def rotate(ls, n):
-    n = n % len(ls)
-    return ls[n : ] + ls[ : n]
-
 def chunks(ls, n):
     return [ls[i : i + n] for i in range(0, len(ls), n)]
+
+def gcd_time(*durations):
+    """Returns the greatest common divisor of timedeltas."""
+    micro = timedelta(microseconds=1)
+    return math.gcd(*(duration // micro for duration in durations))*micro
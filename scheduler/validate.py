@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""Contains validate, which checks a finished schedule for every kind of conflict at once.
+
+Events are read once, as integer seconds, from either a Tournament or a CompactSchedule and sorted
+once by start time. Grouping the sorted events by judging room, by table and by team then gives an
+interval index per group, already in order, and each is swept a single time with the latest end
+seen so far: an event starting before that end overlaps an earlier one. The whole check is
+O(n log n) in the number of events, cheap enough to run after every search candidate."""
+from collections import namedtuple
+from datetime import timedelta
+from scheduler.timeline import from_seconds, to_seconds
+
+KINDS = ('room', 'table', 'travel', 'lunch', 'missing')
+
+Violation = namedtuple('Violation', 'kind teams activity loc start detail')
+Violation.__doc__ = """A broken rule, found by validate.
+
+kind -- one of KINDS
+teams -- the indices of the teams involved: for overlaps, the one holding the room or table
+         longest and then the one starting inside its event
+activity, loc -- the event's activity id and room or table (None for lunch)
+start -- when the later of two events starts, or for lunch the earliest a team is free for it
+         (None for a missing event)
+detail -- how long events overlap (room, table), the gap between them (travel), or None"""
+
+def validate(sched):
+    """Returns a list of Violations found in a scheduled Tournament or a CompactSchedule,
+    ordered by kind as in KINDS and then by time.
+
+    A room or table overlap is two teams' events in the same judging room (of one category) or
+    at the same table at once. A travel violation is a team event starting less than the travel
+    time after the team's previous events end, a lunch violation a team with no gap of the lunch
+    length starting within the lunch window, and a missing event an activity (the opening
+    events, each judging category and each table round) a team has no event for."""
+    events, num_teams, travel, lunch, t_rounds = _read(sched)
+    events.sort()
+    rooms, tables, teams = {}, {}, [[] for _ in range(num_teams)]
+    for event in events:
+        activity, loc = event[3], event[4]
+        if 2 <= activity <= 4:
+            rooms.setdefault((activity, loc), []).append(event)
+        elif activity > 4:
+            tables.setdefault(loc, []).append(event)
+        teams[event[2]].append(event)
+
+    found = []
+    for kind, index in (('room', rooms), ('table', tables)):
+        for key in sorted(index):
+            found += _overlaps(kind, index[key])
+    for team_events in teams:
+        found += _travel(team_events, to_seconds(travel))
+    earliest, latest, length = map(to_seconds, lunch)
+    for team, team_events in enumerate(teams):
+        free = _first_gap(team_events, earliest, length)
+        if free > latest:
+            found.append(Violation('lunch', (team,), None, None, from_seconds(free), None))
+    required = set(range(5 + t_rounds))
+    for team, team_events in enumerate(teams):
+        for activity in sorted(required - {event[3] for event in team_events}):
+            found.append(Violation('missing', (team,), activity, None, None, None))
+    return found
+
+def _read(sched):
+    """Returns the (start, end, team, activity, loc) events of a schedule, in seconds, with its
+    number of teams, travel time, lunch window and number of table rounds."""
+    if hasattr(sched, 'columns'): #a CompactSchedule, whose seconds count from the same epoch
+        cols, params = sched.columns, sched.meta['logic_params']
+        events = [(start, start + duration, team, activity, loc) for team, activity, loc, start,
+                  duration in zip(cols['event_team'], cols['event_activity'], cols['event_loc'],
+                                  cols['event_start'], cols['event_duration'])]
+        return events, len(sched.meta['teams']), params[3], params[6], params[12]
+    events = [(to_seconds(start), to_seconds(start) + to_seconds(duration), team, activity, loc)
+              for team, obj in enumerate(sched.teams)
+              for start, duration, activity, loc in obj.events]
+    return events, len(sched.teams), sched.travel, sched.lunch, sched.t_rounds
+
+def _overlaps(kind, events):
+    """Returns a Violation for each event, of a room or table, starting before another ends."""
+    found, reach, holder = [], None, None
+    for start, end, team, activity, loc in events:
+        if reach is not None and start < reach:
+            found.append(Violation(kind, (holder, team), activity, loc, from_seconds(start),
+                                   timedelta(seconds=min(end, reach) - start)))
+        if reach is None or end > reach:
+            reach, holder = end, team
+    return found
+
+def _travel(events, travel):
+    """Returns a Violation for each of a team's events starting less than travel after the
+    latest end of its earlier events."""
+    found, reach = [], None
+    for start, end, team, activity, loc in events:
+        if reach is not None and start - reach < travel:
+            found.append(Violation('travel', (team,), activity, loc, from_seconds(start),
+                                   timedelta(seconds=start - reach)))
+        reach = end if reach is None else max(reach, end)
+    return found
+
+def _first_gap(events, earliest, length):
+    """Returns the first time from earliest that a team is free for length (in seconds)."""
+    free = earliest
+    for start, end, *_ in events:
+        if end > free:
+            if start >= free + length:
+                break
+            free = max(free, end)
+    return free
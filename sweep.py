@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""Schedules one roster under every combination of a range of settings and compares the results.
+
+The input workbook is read once and its settings are handed to each worker process when it starts,
+so the workers schedule every combination of the judging sets, table pairs, staggering, matches
+between table breaks and judging break length given without reading or parsing it again. Each
+schedule is scored on when the day ends, the most table repeats any team has, the shortest gap
+between two of a team's events and how many teams go without a lunch break. The combinations no
+other beats on all four (the Pareto front) are printed as a table, and every result can be saved
+as JSON."""
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import os
+import sys
+import traceback
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import timedelta
+import schedule
+from scheduler.cache import ScheduleCache
+from scheduler.validate import validate
+
+#the settings a sweep can vary, with their positions in logic_params
+SETTINGS = {'j_sets': 8, 't_pairs': 13, 't_stagger': 14, 't_consec': 15, 'j_break': 11}
+
+#each objective and whether larger values are better
+OBJECTIVES = (('end', False), ('max_repeats', False), ('min_gap', True), ('no_lunch', False))
+
+_logic_params = None #the roster and settings each worker schedules variations of
+
+def combinations(ranges):
+    """Returns a settings dict for every combination of the values given for each setting.
+
+    ranges -- {setting: values} for any of the names in SETTINGS"""
+    unknown = set(ranges) - set(SETTINGS)
+    if unknown:
+        raise KeyError("Settings {} can't be swept".format(', '.join(sorted(unknown))))
+    names = [name for name in SETTINGS if name in ranges]
+    return [dict(zip(names, values)) for values in itertools.product(*map(ranges.get, names))]
+
+def vary(logic_params, settings):
+    """Returns logic_params with the given settings changed; j_break is a length in minutes."""
+    params = list(logic_params)
+    for name, value in settings.items():
+        if name == 'j_break':
+            value = (params[SETTINGS[name]][0], timedelta(minutes=value))
+        params[SETTINGS[name]] = value
+    return tuple(params)
+
+def evaluate(tment):
+    """Returns the objectives of a scheduled tournament: when its last event ends (as minutes
+    after midnight), the most matches any team plays at a table it has already played at, the
+    minutes between the closest two events of any team, and how many teams miss lunch."""
+    end = max(event[0] + event[1] for team in tment.teams for event in team.events)
+    repeats = [sum(count - 1 for count in Counter(event[3] for event in team.events
+                                                  if event[2] > 4).values())
+               for team in tment.teams]
+    return {'end': end.hour*60 + end.minute + end.second / 60,
+            'max_repeats': max(repeats, default=0),
+            'min_gap': min(team.closest_events() for team in tment.teams) / timedelta(minutes=1),
+            'no_lunch': sum(violation.kind == 'lunch' for violation in validate(tment))}
+
+def schedule_settings(settings, cache=None, logic_params=None, search_workers=1):
+    """Schedules one combination of settings; never raises.
+
+    logic_params -- the roster and settings to vary (default: those shared with the worker)
+    search_workers -- processes searching the schedule's tables (default 1)
+    Returns a dict of the settings, their objectives and the error (a traceback) if scheduling
+    failed."""
+    result = {'settings': settings, 'error': None}
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            tment = schedule.run_tournament(vary(logic_params or _logic_params, settings), cache,
+                                            workers=search_workers)
+        result.update(evaluate(tment))
+    except Exception:
+        result['error'] = traceback.format_exc()
+    return result
+
+def _share(logic_params):
+    """Keeps the settings to vary in a worker process, so each task only sends what changes."""
+    global _logic_params
+    _logic_params = logic_params
+
+def sweep(logic_params, ranges, workers=None, cache=None, search_workers=1):
+    """Schedules every combination of the ranges of settings, returning the results in order.
+
+    logic_params -- the tournament settings, as returned by schedule.read_data
+    ranges -- {setting: values} for any of the names in SETTINGS
+    workers -- the number of worker processes (default: the number of CPUs); 1 runs in-process
+    cache -- a ScheduleCache shared by the workers (default None)
+    search_workers -- processes each worker searches table schedules on (default 1)
+    Each result is marked 'pareto' if no other result is at least as good on every objective
+    and better on one."""
+    grid = combinations(ranges)
+    workers = min(workers or os.cpu_count() or 1, len(grid)) or 1
+    if workers == 1:
+        results = [schedule_settings(settings, cache, logic_params, search_workers)
+                   for settings in grid]
+    else:
+        results = [None]*len(grid)
+        with ProcessPoolExecutor(workers, initializer=_share, initargs=(logic_params,)) as pool:
+            futures = {pool.submit(schedule_settings, settings, cache, None, search_workers): i
+                       for i, settings in enumerate(grid)}
+            for done, future in enumerate(as_completed(futures), 1):
+                results[futures[future]] = future.result()
+                print(f'[{done}/{len(grid)}] {_describe(results[futures[future]]["settings"])}',
+                      file=sys.stderr)
+    for result in results:
+        result['pareto'] = not result['error'] and \
+                           not any(_dominates(other, result) for other in results)
+    return results
+
+def _dominates(first, second):
+    """Returns whether the first result is no worse than the second on every objective and
+    better on at least one (a failed result dominates nothing)."""
+    if first['error']:
+        return False
+    signs = [1 if larger else -1 for _, larger in OBJECTIVES]
+    keys = [(sign*first[name], sign*second[name]) for (name, _), sign in zip(OBJECTIVES, signs)]
+    return all(mine >= theirs for mine, theirs in keys) and \
+           any(mine > theirs for mine, theirs in keys)
+
+def _describe(settings):
+    """Returns the settings as a short name=value list."""
+    return ' '.join(f'{name}={value}' for name, value in settings.items())
+
+def table(results, front_only=True):
+    """Returns a printable table of the results (by default only the Pareto front), ordered by
+    the end of the day, followed by the settings that failed to schedule."""
+    names = list(results[0]['settings']) if results else []
+    lines = [' '.join(f'{name:>9}' for name in names) +
+             f" {'ends':>6} {'repeats':>8} {'min gap':>8} {'no lunch':>9}"]
+    shown = sorted((result for result in results if not result['error'] and
+                    (result['pareto'] or not front_only)),
+                   key=lambda result: [result[name]*(-1 if larger else 1)
+                                       for name, larger in OBJECTIVES])
+    for result in shown:
+        end = int(round(result['end']))
+        lines.append(' '.join(f'{str(result["settings"][name]):>9}' for name in names) +
+                     f" {end // 60:>3}:{end % 60:02} {result['max_repeats']:>8}"
+                     f" {result['min_gap']:>8.1f} {result['no_lunch']:>9}"
+                     + ('' if front_only or not result['pareto'] else ' *'))
+    for result in results:
+        if result['error']:
+            lines += ['', _describe(result['settings']) + ':', result['error'].rstrip()]
+    return '\n'.join(lines)
+
+def _values(text):
+    """Parses a comma-separated list of integers and inclusive ranges such as 4-6."""
+    values = []
+    for part in text.split(','):
+        first, _, last = part.partition('-')
+        values += range(int(first), int(last or first) + 1)
+    return values
+
+def _switch(text):
+    """Parses a comma-separated list of yes/no values."""
+    choices = {'yes': True, 'no': False}
+    try:
+        return [choices[part.strip().lower()] for part in text.split(',')]
+    except KeyError:
+        raise argparse.ArgumentTypeError("expected yes, no or yes,no")
+
+def main(argv=None):
+    """Runs a sweep from the command line; returns 1 if no combination could be scheduled."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('file', help="the input workbook whose roster and other settings are used")
+    parser.add_argument('--j-sets', type=_values, metavar='VALUES',
+                        help="judging rooms per category, as a list such as 4,5 or a range 4-6")
+    parser.add_argument('--t-pairs', type=_values, metavar='VALUES', help="pairs of tables")
+    parser.add_argument('--t-stagger', type=_switch, metavar='yes,no',
+                        help="whether to stagger table pairs")
+    parser.add_argument('--t-consec', type=_values, metavar='VALUES',
+                        help="matches in a row before the tables break")
+    parser.add_argument('--j-break', type=_values, metavar='MINUTES',
+                        help="length of the judges' breaks")
+    parser.add_argument('-j', '--workers', type=int,
+                        help="worker processes to use (default: the number of CPUs)")
+    parser.add_argument('--search-workers', type=int, default=1, metavar='N',
+                        help="also search each schedule's tables on N processes")
+    parser.add_argument('--all', action='store_true',
+                        help="list every combination, marking the Pareto front with *")
+    parser.add_argument('--report', help="write every result to this JSON file")
+    parser.add_argument('--cache', action='store_true',
+                        help="reuse a finished schedule saved for the same settings, and save "
+                             "new ones, in an on-disk cache")
+    parser.add_argument('--cache-dir', help="where schedules are cached, implying --cache "
+                                            "(default: a per-user cache directory)")
+    args = parser.parse_args(argv)
+
+    ranges = {name: getattr(args, name) for name in SETTINGS if getattr(args, name) is not None}
+    if not ranges:
+        parser.error("give a range for at least one of " +
+                     ', '.join('--' + name.replace('_', '-') for name in SETTINGS))
+    logic_params, _, _ = schedule.read_data(args.file)
+    cache = ScheduleCache(args.cache_dir) if args.cache or args.cache_dir else None
+    results = sweep(logic_params, ranges, args.workers, cache, args.search_workers)
+    print(table(results, not args.all))
+    if args.report:
+        with open(args.report, 'w') as fout:
+            json.dump(results, fout, indent=2)
+    return int(all(result['error'] for result in results))
+
+if __name__ == "__main__":
+    sys.exit(main())
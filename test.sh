@@ -1,4 +1,6 @@
 #!/bin/bash
+$PWD/benchmark.py --import-budget 0.2 || exit 1
+$PWD/benchmark.py --method Interlaced --method Block --output /dev/null || exit 1
 rm -rf tests/*.xlsx
 for filename in tests/*.xlsm; do
   [ -e "$filename" ] || continue 